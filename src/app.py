@@ -1,31 +1,159 @@
+import threading
 import streamlit as st
 
-from match_predictor import run_predictions
-from read_stats import read_stats
+from match_predictor import load_match_history, build_features, run_predictions
+from store import store_version
+from standings import load_standings, standings_as_of, team_history
+from simulation import simulate_season
+from metrics import request_summary, stage_summary, prometheus_text
 
-st.title("NHL Match Predictor")
+class RefreshJob:
+    '''
+    -----------------------------------------
+    Runs read_stats on a background thread, shared by every viewer so only
+    one scrape runs at a time, and keeps its progress messages
+    Use: job = RefreshJob(); job.start()
+    -----------------------------------------
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.messages = []
+        self.error = None
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        with self.lock:
+            if self.running():
+                return False
+            self.messages = []
+            self.error = None
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            return True
+
+    def run(self):
+        try:
+            #the scraper (requests, bs4, lxml) is only imported once an update is asked for
+            from read_stats import read_stats
+            read_stats(progress=self.log)
+        except Exception as e:
+            self.error = str(e)
+
+    def log(self, message):
+        with self.lock:
+            self.messages.append(message)
+
+@st.cache_resource
+def refresh_job():
+    return RefreshJob()
+
+#cached results are shared across sessions and keyed on the store version
+@st.cache_data(show_spinner=False)
+def cached_matches(version):
+    return load_match_history()
+
+@st.cache_data(show_spinner=False)
+def cached_matchups(version, _matches):
+    return build_features(_matches)
+
+@st.cache_data(show_spinner="Running predictions...")
+def cached_predictions(version, _matches, _matchups):
+    return run_predictions(_matches, _matchups)
+
+@st.cache_data(show_spinner="Simulating the season...")
+def cached_projections(version, _predictions, _matches):
+    return simulate_season(_predictions, _matches)
+
+@st.cache_data(show_spinner=False)
+def cached_standings(version):
+    return load_standings()
+
+@st.fragment(run_every=1)
+def refresh_progress(job):
+    if job.running():
+        st.info(f"Updating stats... {len(job.messages)} updates so far")
+        st.code("\n".join(job.messages[-8:]) or "Starting...")
+    else:
+        #the job ended, rerun the whole page once to show its outcome and any data it
+        #stored (a run can fail after writing the store); the page stops polling then
+        st.rerun()
 
-# Button to update stats
-if st.button("Update Stats"):
-    with st.spinner("Updating stats..."):
-        read_stats()  # Call the function when button is clicked
+def refresh_status(job):
+    if job.running():
+        refresh_progress(job)
+    elif job.error:
+        st.error(f"Update failed: {job.error}")
+    elif job.messages:
         st.success("Stats updated!")
-    
-    # Run predictions with updated data
-    eval_df, prob_pred_df, high_conf = run_predictions()
-    
-    st.subheader("High Confidence Predictions")
-    st.dataframe(high_conf)
-    
-    st.subheader("All Predictions")
-    st.dataframe(prob_pred_df)
-
-else:
-    # Show predictions with existing data (no update)
-    eval_df, prob_pred_df, high_conf = run_predictions()
-    
-    st.subheader("High Confidence Predictions")
-    st.dataframe(high_conf[["date","season", "home_team", "away_team", "home_win_probability", "away_win_probability","predicted_winner"]])
-    
-    st.subheader("All Predictions")
-    st.dataframe(prob_pred_df[["date","season", "home_team", "away_team", "home_win_probability", "away_win_probability","prediction", "predicted_winner"]])
+        from fetcher import cache_stats
+        stats = cache_stats()
+        st.caption(f"Page cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} downloaded")
+
+st.title("NHL Match Predictor")
+
+job = refresh_job()
+
+# Button to update stats in the background
+if st.button("Update Stats", disabled=job.running()):
+    job.start()
+
+version = store_version()
+refresh_status(job)
+
+# Show predictions with the latest stored data
+matches = cached_matches(version)
+matchups = cached_matchups(version, matches)
+eval_df, prob_pred_df, high_conf = cached_predictions(version, matches, matchups)
+
+st.subheader("High Confidence Predictions")
+st.dataframe(high_conf[["date","season", "home_team", "away_team", "home_win_probability", "away_win_probability","predicted_winner"]])
+
+st.subheader("All Predictions")
+st.dataframe(prob_pred_df[["date","season", "home_team", "away_team", "home_win_probability", "away_win_probability","prediction", "predicted_winner"]])
+
+#final standings and playoff odds from simulating the rest of the season
+if not prob_pred_df.empty:
+    st.subheader("Season Projections")
+    projections = cached_projections(version, prob_pred_df, matches)
+    conference = st.radio("Conference", sorted(projections["conference"].dropna().unique()), horizontal=True)
+    shown = projections[projections["conference"] == conference]
+    st.dataframe(shown[["division", "team", "points", "projected_points", "points_p10", "points_p90",
+                        "division_title", "playoff_probability"]], hide_index=True)
+    st.bar_chart(shown.sort_values("playoff_probability", ascending=False), x="team", y="playoff_probability")
+
+#standings are maintained at ingest, the app only filters them
+STANDINGS_COLUMNS = ["team", "gp", "wins", "losses", "win_rate", "avg_shots", "shooting_accuracy", "avg_pim"]
+standings = cached_standings(version)
+if not standings.empty:
+    st.subheader("Standings")
+    seasons = sorted(standings["season"].unique(), reverse=True)
+    season = st.selectbox("Season", seasons)
+    season_rows = standings[standings["season"] == season]
+    #plain dates, the picker compares the dates sent back on a rerun against its bounds
+    first, last = season_rows["date"].min().date(), season_rows["date"].max().date()
+    as_of = st.date_input("As of", value=last, min_value=first, max_value=last)
+    st.dataframe(standings_as_of(standings, as_of, season)[STANDINGS_COLUMNS], hide_index=True)
+
+    team = st.selectbox("Team", sorted(season_rows["team"].unique()))
+    history = team_history(standings, team, season)
+    st.line_chart(history, x="date", y="win_rate")
+    st.dataframe(history[["date"] + STANDINGS_COLUMNS[1:]], hide_index=True)
+
+#timings and request stats recorded by the metrics module in this process
+with st.expander("Pipeline Metrics"):
+    stages = stage_summary()
+    if stages:
+        st.dataframe([{
+            "stage": event["stage"],
+            "seconds": event["seconds"],
+            "rows": event.get("rows"),
+            "stage peak memory (MB)": event["peak_memory_bytes"] / 1e6 if event["peak_memory_bytes"] else None,
+            "process peak rss (MB)": event["process_peak_rss_bytes"] / 1e6 if event["process_peak_rss_bytes"] else None,
+        } for event in stages], hide_index=True)
+    requests_seen = request_summary()
+    if requests_seen:
+        st.dataframe(requests_seen, hide_index=True)
+    st.download_button("Prometheus metrics", prometheus_text(), file_name="metrics.prom")
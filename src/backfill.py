@@ -0,0 +1,170 @@
+import os
+import glob
+import argparse
+import requests
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from fetcher import fetch, get_fetcher, site_url
+from read_stats import team_links, parse_team_season, ingest
+
+#parsed (team, season) results and finished season markers, so a rerun picks up where it stopped
+CHECKPOINT_DIR = "backfill_checkpoints"
+
+def season_label(year):
+    return f"{year-1}-{year}"
+
+def checkpoint_path(season, abbreviation, suffix, directory=CHECKPOINT_DIR):
+    return os.path.join(directory, season, f"{abbreviation}.{suffix}")
+
+def season_done(season, directory=CHECKPOINT_DIR):
+    return os.path.exists(os.path.join(directory, season, "_SUCCESS"))
+
+def plan_season(year, progress=print):
+    '''
+    -----------------------------------------
+    Lists the (team, season) page fetches of one season from its league page,
+    schedule and game log urls follow from each team's season url
+    Use: tasks = plan_season(year)
+    -----------------------------------------
+    Parameters:
+        year - (int) year the season ends
+        progress - (function) called with the reason a season is skipped
+    Returns:
+        tasks - (list) dicts with season, abbreviation, team, schedule_url, gamelog_url,
+                empty if the league has no page for the season (e.g. the 2005 lockout)
+                or the page has no standings to read
+    Raises:
+        requests.RequestException - the league page could not be fetched for any other reason
+    -----------------------------------------
+    '''
+    try:
+        team_urls, team_names = team_links(site_url(f"/leagues/NHL_{year}.html"))
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        progress(f"No league page for {season_label(year)}, skipping")
+        return []
+    except ValueError as e:
+        progress(f"Could not read the league page for {season_label(year)}, skipping: {e}")
+        return []
+    tasks = []
+    for team_url, team_name in zip(team_urls, team_names):
+        base = team_url[:-len(".html")]
+        tasks.append({
+            "season": season_label(year),
+            "abbreviation": base.rstrip("/").split("/")[-2],
+            "team": team_name,
+            "schedule_url": f"{base}_games.html",
+            "gamelog_url": f"{base}_gamelog.html",
+        })
+    return tasks
+
+def fetch_pages(task):
+    return fetch(task["schedule_url"]), fetch(task["gamelog_url"])
+
+def finish_season(season, directory=CHECKPOINT_DIR, progress=print):
+    '''
+    -----------------------------------------
+    Writes a season's checkpointed team results to the match store, marking
+    the season done unless some of its teams failed
+    Use: finish_season(season)
+    -----------------------------------------
+    '''
+    frames = [pd.read_pickle(path) for path in sorted(glob.glob(os.path.join(directory, season, "*.pkl")))]
+    failed = sorted(glob.glob(os.path.join(directory, season, "*.failed")))
+    if frames:
+        season_df = pd.concat(frames, ignore_index=True)
+        season_df.columns = [c.lower() for c in season_df.columns]
+        ingest(season_df, [season], progress)
+    if failed:
+        progress(f"Wrote {season} with {len(failed)} teams missing, rerun to retry them")
+        return
+    open(os.path.join(directory, season, "_SUCCESS"), "w").close()
+    progress(f"Wrote {season}: {len(frames)} teams")
+
+def backfill(start, end, workers=None, directory=CHECKPOINT_DIR, progress=print):
+    '''
+    -----------------------------------------
+    Backfills the match store with every season from start to end: plans all
+    team season page fetches up front, fetches them on the shared rate limited
+    fetcher, parses them in worker processes, checkpoints each team season and
+    writes each season's partition as soon as all its teams are in
+    Use: backfill(2001, 2021)
+    -----------------------------------------
+    Parameters:
+        start - (int) first season, by the year it ends
+        end - (int) last season, by the year it ends
+        workers - (int) parsing processes, defaults to the number of cores
+        directory - (string) checkpoint folder
+        progress - (function) called with status messages
+    Returns:
+        None
+    -----------------------------------------
+    '''
+    fetcher = get_fetcher()
+    years = [year for year in range(end, start - 1, -1) if not season_done(season_label(year), directory)]
+    plans = fetcher.map(lambda year: plan_season(year, progress), years)
+
+    #remaining team seasons per season, skipping ones already checkpointed
+    remaining = {}
+    tasks = []
+    for year, season_tasks in zip(years, plans):
+        if not season_tasks:
+            continue
+        season = season_label(year)
+        os.makedirs(os.path.join(directory, season), exist_ok=True)
+        todo = [task for task in season_tasks
+                if not os.path.exists(checkpoint_path(season, task["abbreviation"], "pkl", directory))]
+        remaining[season] = len(todo)
+        tasks += todo
+    progress(f"Planned {len(tasks)} team seasons over {len(remaining)} seasons")
+
+    for season in [season for season, count in remaining.items() if count == 0]:
+        finish_season(season, directory, progress)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as parsers:
+        fetching = {fetcher.submit(fetch_pages, task): task for task in tasks}
+        parsing = {}
+        while fetching or parsing:
+            done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetching:
+                    task = fetching.pop(future)
+                    try:
+                        schedule_html, gamelog_html = future.result()
+                    except Exception as e:
+                        result = e
+                    else:
+                        parsing[parsers.submit(parse_team_season, schedule_html, gamelog_html, task["team"], task["season"])] = task
+                        continue
+                else:
+                    task = parsing.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+
+                season, abbreviation = task["season"], task["abbreviation"]
+                failed_path = checkpoint_path(season, abbreviation, "failed", directory)
+                if isinstance(result, Exception) or result is None:
+                    with open(failed_path, "w") as f:
+                        f.write(str(result) if result is not None else "schedule and game log do not line up")
+                    progress(f"Failed {task['team']} {season}: {result}")
+                else:
+                    result.to_pickle(checkpoint_path(season, abbreviation, "pkl", directory))
+                    if os.path.exists(failed_path):
+                        os.remove(failed_path)
+                    progress(f"Successfully read {task['team']} {season} stats")
+
+                remaining[season] -= 1
+                if remaining[season] == 0:
+                    finish_season(season, directory, progress)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill past seasons into the match store")
+    parser.add_argument("start", type=int, help="first season, by the year it ends (e.g. 2001 for 2000-2001)")
+    parser.add_argument("end", type=int, help="last season, by the year it ends")
+    parser.add_argument("--workers", type=int, default=None, help="parsing processes")
+    args = parser.parse_args()
+    backfill(args.start, args.end, workers=args.workers)
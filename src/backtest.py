@@ -0,0 +1,165 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import accuracy_score, brier_score_loss, log_loss
+
+from match_predictor import load_match_history, build_features, make_model, PREDICTORS
+
+#feature matrix shared with worker processes, set once per worker by init_worker
+_x = None
+_y = None
+
+def init_worker(x, y):
+    global _x, _y
+    _x = x
+    _y = y
+
+def fit_fold(fold):
+    '''
+    -----------------------------------------
+    Trains on every game before the fold and scores the fold's games
+    Use: probs = fit_fold((train_end, test_end))
+    -----------------------------------------
+    Parameters:
+        fold - (tuple) train_end, test_end row positions in the date sorted matrix
+    Returns:
+        probs - (ndarray) home win probabilities for rows train_end..test_end
+    -----------------------------------------
+    '''
+    train_end, test_end = fold
+    model = make_model()
+    model.set_params(n_jobs=1)
+    model.fit(_x[:train_end], _y[:train_end])
+    return model.predict_proba(_x[train_end:test_end])[:, 1]
+
+def completed_matchups(matchups):
+    '''
+    -----------------------------------------
+    Keeps matchups with both sides and a result, sorted by date
+    Use: games = completed_matchups(matchups)
+    -----------------------------------------
+    '''
+    games = matchups[matchups["result_home"].notna() & matchups["home_team"].notna() & matchups["away_team"].notna()]
+    return games.sort_values("date", kind="stable", ignore_index=True)
+
+def plan_folds(dates, min_train=500, step_games=None, freq="W"):
+    '''
+    -----------------------------------------
+    Splits date sorted games into walk-forward folds with an expanding training window
+    Use: folds = plan_folds(dates, min_train, step_games, freq)
+    -----------------------------------------
+    Parameters:
+        dates - (series) sorted game dates
+        min_train - (int) games in the first training window
+        step_games - (int) games per fold, overrides freq
+        freq - (string) pandas period for calendar folds, e.g. W for weekly
+    Returns:
+        folds - (list) (train_end, test_end) row positions
+    -----------------------------------------
+    '''
+    n = len(dates)
+    if step_games:
+        bounds = list(range(min_train, n, step_games)) + [n]
+    else:
+        #fold edges at the first game of each period, never splitting a day
+        periods = dates.dt.to_period(freq)
+        edges = np.flatnonzero(periods.ne(periods.shift()).to_numpy())
+        bounds = [edge for edge in edges if edge >= min_train] + [n]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def calibration_table(y, probs, bins=10):
+    '''
+    -----------------------------------------
+    Groups predictions into probability bins and compares them with outcomes
+    Use: table = calibration_table(y, probs)
+    -----------------------------------------
+    '''
+    edges = np.linspace(0, 1, bins + 1)
+    frame = pd.DataFrame({"bin": pd.cut(probs, edges, include_lowest=True), "prob": probs, "home_win": y})
+    table = frame.groupby("bin", observed=True).agg(games=("prob", "size"), predicted=("prob", "mean"), observed=("home_win", "mean"))
+    return table.reset_index()
+
+def season_metrics(results):
+    '''
+    -----------------------------------------
+    Accuracy, log-loss and Brier score per season of backtest results
+    Use: table = season_metrics(results)
+    -----------------------------------------
+    '''
+    rows = []
+    for season, games in results.groupby("season", observed=True):
+        rows.append({
+            "season": season,
+            "games": len(games),
+            "accuracy": accuracy_score(games["target"], games["probability"] >= 0.5),
+            "log_loss": log_loss(games["target"], games["probability"], labels=[0, 1]),
+            "brier": brier_score_loss(games["target"], games["probability"]),
+        })
+    return pd.DataFrame(rows)
+
+def run_backtest(matchups=None, min_train=500, step_games=None, freq="W", workers=None):
+    '''
+    -----------------------------------------
+    Walk-forward backtest: retrains on all earlier games before each fold and
+    scores the fold out of sample, folds train in parallel processes
+    Use: results, seasons, calibration = run_backtest()
+    -----------------------------------------
+    Parameters:
+        matchups - (dataframe) output of build_features, built from the store if not given
+        min_train - (int) games in the first training window
+        step_games - (int) games per fold, default is one fold per week
+        freq - (string) calendar fold period when step_games is not set
+        workers - (int) processes, defaults to the number of cores
+    Returns:
+        results - (dataframe) every scored game with its out of sample probability
+        seasons - (dataframe) per season accuracy, log-loss and Brier score
+        calibration - (dataframe) predicted vs observed home win rate by probability bin
+    Raises:
+        ValueError - no completed games after the first min_train to score
+    -----------------------------------------
+    '''
+    if matchups is None:
+        matchups = build_features(load_match_history())
+    games = completed_matchups(matchups)
+
+    #features are built once and shipped to each worker once
+    x = games[PREDICTORS].to_numpy(dtype=np.float32)
+    y = games["target"].to_numpy()
+    folds = plan_folds(games["date"], min_train, step_games, freq)
+    if not folds:
+        raise ValueError(f"Backtest needs more than {min_train} completed games (min_train), found {len(games)}")
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=init_worker, initargs=(x, y)) as pool:
+        fold_probs = list(pool.map(fit_fold, folds))
+
+    scored = slice(folds[0][0], folds[-1][1])
+    results = games.iloc[scored][["date", "season", "home_team", "away_team", "target"]].assign(probability=np.concatenate(fold_probs))
+
+    seasons = season_metrics(results)
+    calibration = calibration_table(results["target"].to_numpy(), results["probability"].to_numpy())
+    return results, seasons, calibration
+
+def report_backtest(results, seasons, calibration):
+    '''
+    -----------------------------------------
+    Prints the per season and calibration tables and saves every scored game
+    to backtest_results.csv
+    Use: report_backtest(*run_backtest())
+    -----------------------------------------
+    '''
+    print("----- Backtest by Season -----")
+    print(seasons.to_string(index=False, float_format="%.3f"))
+    print("----- Calibration -----")
+    print(calibration.to_string(index=False, float_format="%.3f"))
+    results.to_csv("backtest_results.csv", index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the prediction model")
+    parser.add_argument("--step-games", type=int, default=None, help="games per fold (default: weekly folds)")
+    parser.add_argument("--min-train", type=int, default=500, help="games in the first training window")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    args = parser.parse_args()
+
+    report_backtest(*run_backtest(min_train=args.min_train, step_games=args.step_games, workers=args.workers))
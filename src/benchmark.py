@@ -0,0 +1,565 @@
+import io
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from contextlib import redirect_stdout
+
+from store import load_matches
+from features import ROLLING_COLS
+
+def timed(fn, repeat=3):
+    '''
+    -----------------------------------------
+    Times a function, keeping the best of repeat runs
+    Use: seconds, result = timed(fn, repeat)
+    -----------------------------------------
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def scaled_matches(scale):
+    '''
+    -----------------------------------------
+    Scales up the stored match history by copying the league scale times
+    under renamed teams, keeping every team's schedule intact
+    Use: matches = scaled_matches(scale)
+    -----------------------------------------
+    Parameters:
+        scale - (int) number of league copies
+    Returns:
+        matches - (dataframe) scaled match data
+    -----------------------------------------
+    '''
+    matches = load_matches()
+    copies = []
+    for k in range(scale):
+        copy = matches.copy()
+        if k > 0:
+            for col in ["team", "opponent"]:
+                copy[col] = copy[col].astype(str) + f" {k}"
+        copies.append(copy)
+    matches = pd.concat(copies, ignore_index=True)
+    for col in ["team", "opponent"]:
+        matches[col] = matches[col].astype("category")
+    return matches
+
+def synthetic_league(teams=32, seasons=5, games=82, end_year=2025, seed=0):
+    '''
+    -----------------------------------------
+    Generates a league with the matches.csv schema: every round each team
+    plays one game against a random opponent, with shots, goals, penalties and
+    power plays drawn around a fixed team strength so the model has something
+    to learn, one row per team per game like the scraped data
+    Use: matches = synthetic_league(teams, seasons, games)
+    -----------------------------------------
+    Parameters:
+        teams - (int) teams in the league, even; registry names are used first
+        seasons - (int) seasons, the last one ending in end_year
+        games - (int) games per team per season
+        end_year - (int) year the last season ends
+        seed - (int) random seed
+    Returns:
+        matches - (dataframe) match data with the matches.csv columns
+    -----------------------------------------
+    '''
+    from teams import TEAM_NAMES
+
+    rng = np.random.default_rng(seed)
+    names = np.array([TEAM_NAMES[i] if i in TEAM_NAMES else f"Synthetic Team {i}" for i in range(teams)], dtype=object)
+    strength = rng.normal(0, 0.15, teams)
+
+    #rounds x teams, consecutive pairs of each shuffled round play each other
+    rounds = seasons * games
+    order = rng.permuted(np.tile(np.arange(teams), (rounds, 1)), axis=1)
+    home = order[:, 0::2].ravel()
+    away = order[:, 1::2].ravel()
+    round_index = np.repeat(np.arange(rounds), teams // 2)
+    season_index = round_index // games
+    years = end_year - seasons + 1 + season_index
+    starts = pd.to_datetime([f"{year - 1}-10-08" for year in range(end_year - seasons + 1, end_year + 1)])
+    #a round every 2 days, about 6 months for 82 games
+    date = starts[season_index] + pd.to_timedelta((round_index % games) * 180 // games, unit="D")
+
+    n = len(home)
+    edge = strength[home] - strength[away]
+    sog_home = rng.poisson(31 * np.exp(edge + 0.03))
+    sog_away = rng.poisson(31 * np.exp(-edge))
+    gf_home = rng.binomial(sog_home, 0.095)
+    gf_away = rng.binomial(sog_away, 0.095)
+    #ties go to overtime or a shootout, the winner gets one more goal
+    tied = gf_home == gf_away
+    ot = np.where(tied, np.where(rng.random(n) < 0.6, "OT", "SO"), None)
+    home_wins = np.where(tied, rng.random(n) < 0.5 + edge, gf_home > gf_away)
+    gf_home = gf_home + (tied & home_wins)
+    gf_away = gf_away + (tied & ~home_wins)
+    pim_home, pim_away = rng.poisson(8, n), rng.poisson(8, n)
+    ppo_home = rng.binomial(pim_away // 2, 0.8)
+    ppo_away = rng.binomial(pim_home // 2, 0.8)
+    ppg_home, ppg_away = rng.binomial(ppo_home, 0.2), rng.binomial(ppo_away, 0.2)
+
+    def rows(team, opponent, venue, gf, ga, won, sog, sog_against, pim, pim_against, ppg, ppg_against, ppo, ppo_against):
+        return pd.DataFrame({
+            "date": date, "venue": venue, "opponent": names[opponent], "gf": gf.astype(float), "ga": ga.astype(float),
+            "result": np.where(won, "W", "L"), "sog_for": sog.astype(float), "sog_against": sog_against.astype(float),
+            "pim_for": pim.astype(float), "pim_against": pim_against.astype(float), "ot": ot,
+            "ppg_for": ppg.astype(float), "ppg_against": ppg_against.astype(float),
+            "ppo_for": ppo.astype(float), "ppo_against": ppo_against.astype(float),
+            "season": [f"{year - 1}-{year}" for year in years], "team": names[team],
+        })
+
+    matches = pd.concat([
+        rows(home, away, "Home", gf_home, gf_away, home_wins, sog_home, sog_away, pim_home, pim_away,
+             ppg_home, ppg_away, ppo_home, ppo_away),
+        rows(away, home, "Away", gf_away, gf_home, ~home_wins, sog_away, sog_home, pim_away, pim_home,
+             ppg_away, ppg_home, ppo_away, ppo_home),
+    ], ignore_index=True)
+    matches = matches.sort_values(["season", "team", "date"], kind="stable", ignore_index=True)
+
+    #running games played, wins and losses per team season
+    group = matches.groupby(["season", "team"], sort=False)
+    matches["gp"] = group.cumcount() + 1
+    won = (matches["result"] == "W").astype(float)
+    matches["w"] = won.groupby([matches["season"], matches["team"]], sort=False).cumsum()
+    matches["l"] = matches["gp"] - matches["w"]
+    matches["time"] = None
+    matches["date"] = matches["date"].dt.strftime("%Y-%m-%d")
+    return matches[["gp", "date", "venue", "opponent", "gf", "ga", "result", "w", "l", "sog_for", "sog_against",
+                    "pim_for", "pim_against", "ot", "ppg_for", "ppg_against", "ppo_for", "ppo_against",
+                    "season", "team", "time"]]
+
+def league_size(scale, base_seasons=5, max_seasons=50):
+    '''
+    -----------------------------------------
+    Teams and seasons for a league scale times the stored history, adding
+    seasons first and then teams, since dates only go back to 1677
+    Use: teams, seasons = league_size(scale)
+    -----------------------------------------
+    '''
+    seasons = min(base_seasons * scale, max_seasons)
+    teams = 32 * -(-base_seasons * scale // seasons)
+    return teams, seasons
+
+def bench_rolling(scales=(1, 10, 100)):
+    '''
+    -----------------------------------------
+    Compares groupby().apply(rolling_averages) with rolling_features
+    Use: python benchmark.py rolling
+    -----------------------------------------
+    '''
+    from match_predictor import rolling_averages
+    from features import rolling_features
+
+    new_cols = [f"{c}_rolling" for c in ROLLING_COLS]
+    print(f"{'scale':>6} {'rows':>10} {'apply (s)':>10} {'vector (s)':>11} {'speedup':>8} {'3/5/10+ewm (s)':>15}")
+    for scale in scales:
+        matches = scaled_matches(scale)
+        repeat = 1 if scale >= 100 else 3
+        apply_time, _ = timed(lambda: matches.groupby("team", observed=True, group_keys=False).apply(lambda x: rolling_averages(x, ROLLING_COLS, new_cols)), repeat)
+        vector_time, _ = timed(lambda: rolling_features(matches, ROLLING_COLS), repeat)
+        multi_time, _ = timed(lambda: rolling_features(matches, ROLLING_COLS, windows=(3, 5, 10), spans=(5,)), repeat)
+        print(f"{scale:>6} {len(matches):>10} {apply_time:>10.3f} {vector_time:>11.3f} {apply_time / vector_time:>7.1f}x {multi_time:>15.3f}")
+
+def measured(fn, repeat=3):
+    '''
+    -----------------------------------------
+    Times a function (best of repeat untraced runs) and measures the peak
+    memory python and numpy allocate during one more traced run
+    Use: seconds, peak, result = measured(fn, repeat)
+    -----------------------------------------
+    '''
+    seconds, result = timed(fn, repeat)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, result
+
+def bench_pipeline(scales=(1, 10, 100)):
+    '''
+    -----------------------------------------
+    Times every pipeline stage on synthetic leagues 1x, 10x and 100x the
+    size of the stored history (32 teams, 5 seasons): csv and store load,
+    rolling averages, matchups, team stats, model fit and predict_proba,
+    with rows per second and peak allocated memory (xgboost's own native
+    allocations are not traced)
+    Use: python benchmark.py pipeline
+    -----------------------------------------
+    '''
+    from store import write_matches, load_matches
+    from features import rolling_features
+    from match_predictor import MATCH_COLUMNS, PREDICTORS, build_matchups, calculate_team_stats, make_model
+
+    def quiet(fn):
+        def run():
+            with redirect_stdout(io.StringIO()):
+                return fn()
+        return run
+
+    print(f"{'scale':>6} {'stage':>12} {'rows':>10} {'seconds':>9} {'rows/s':>11} {'peak MB':>8}")
+    for scale in scales:
+        teams, seasons = league_size(scale)
+        repeat = 1 if scale >= 100 else 3
+        league = synthetic_league(teams, seasons)
+        #every game is in the past, so rows missing averages are dropped as for history
+        today = pd.Timestamp(league["date"].max()) + pd.Timedelta(days=1)
+
+        def report(name, fn, rows=None):
+            seconds, peak, result = measured(fn, repeat)
+            rows = len(result) if rows is None else rows
+            print(f"{scale:>6} {name:>12} {rows:>10} {seconds:>9.3f} {rows / seconds:>11.0f} {peak / 1e6:>8.1f}")
+            return result
+
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "matches.csv")
+            store_path = os.path.join(directory, "match_store")
+            league.to_csv(csv_path, index=False)
+            write_matches(league, directory=store_path)
+
+            report("load csv", lambda: pd.read_csv(csv_path))
+            matches = report("load store", lambda: load_matches(columns=MATCH_COLUMNS, directory=store_path))
+
+        rolling = report("rolling", lambda: rolling_features(matches, ROLLING_COLS, today=today), len(matches))
+        matchups = report("matchups", lambda: build_matchups(rolling)[0], len(rolling))
+        report("team stats", quiet(lambda: calculate_team_stats(matches)), len(matches))
+
+        cut = int(len(matchups) * 0.8)
+        x_train, y_train = matchups[PREDICTORS].iloc[:cut], matchups["target"].iloc[:cut]
+        x_test = matchups[PREDICTORS].iloc[cut:]
+        model = report("fit", lambda: make_model().fit(x_train, y_train), len(x_train))
+        report("predict", lambda: model.predict_proba(x_test)[:, 1], len(x_test))
+
+def bench_states(scales=(1, 10, 100), queries=1000):
+    '''
+    -----------------------------------------
+    Times building the team state index on synthetic leagues and looking up
+    team states as of random dates, one at a time and in one batch, against
+    recomputing rolling averages over every team's history
+    Use: python benchmark.py states
+    -----------------------------------------
+    '''
+    from store import normalize_matches
+    from features import rolling_features
+    from team_state import TeamStateIndex
+
+    rng = np.random.default_rng(0)
+    print(f"{'scale':>6} {'rows':>10} {'recompute (s)':>14} {'build (s)':>10} {'lookup (us)':>12} {'batch/game (us)':>16}")
+    for scale in scales:
+        teams, seasons = league_size(scale)
+        matches = normalize_matches(synthetic_league(teams, seasons))
+        repeat = 1 if scale >= 100 else 3
+
+        recompute_time, _ = timed(lambda: rolling_features(matches, ROLLING_COLS), repeat)
+        build_time, index = timed(lambda: TeamStateIndex.from_matches(matches, ROLLING_COLS), repeat)
+        names = matches["team"].astype(str).unique()
+        sample_teams = rng.choice(names, queries)
+        sample_dates = matches["date"].sample(queries, replace=True, random_state=0).to_numpy()
+        single_time, _ = timed(lambda: [index.lookup(sample_teams[i:i + 1], sample_dates[i:i + 1]) for i in range(queries)], repeat)
+        batch_time, _ = timed(lambda: index.lookup(sample_teams, sample_dates), repeat)
+        print(f"{scale:>6} {len(matches):>10} {recompute_time:>14.3f} {build_time:>10.3f} "
+              f"{single_time / queries * 1e6:>12.1f} {batch_time / queries * 1e6:>16.2f}")
+
+def bench_simulate(simulation_counts=(1000, 10000, 50000), games=1040):
+    '''
+    -----------------------------------------
+    Times the Monte Carlo season simulator on a synthetic remaining schedule
+    (random matchups of the 32 current teams with random probabilities), in
+    process and over every core
+    Use: python benchmark.py simulate
+    -----------------------------------------
+    '''
+    from teams import TEAM_DIVISIONS, TEAM_NAMES
+    from simulation import simulate_season
+
+    rng = np.random.default_rng(0)
+    teams = np.array([TEAM_NAMES[i] for i in sorted(TEAM_DIVISIONS)], dtype=object)
+    pairs = np.argsort(rng.random((games, len(teams))), axis=1)[:, :2]
+    predictions = pd.DataFrame({
+        "season": "2025-2026",
+        "home_team": teams[pairs[:, 0]],
+        "away_team": teams[pairs[:, 1]],
+        "home_win_probability": rng.uniform(0.3, 0.7, games),
+    })
+    matches = pd.DataFrame(columns=["season", "team", "result", "ot"])
+
+    print(f"{'simulations':>11} {'1 process (s)':>14} {f'{os.cpu_count()} processes (s)':>16} {'seasons/s':>10}")
+    for simulations in simulation_counts:
+        single_time, _ = timed(lambda: simulate_season(predictions, matches, simulations=simulations, workers=1), 1)
+        parallel_time, _ = timed(lambda: simulate_season(predictions, matches, simulations=simulations), 1)
+        print(f"{simulations:>11} {single_time:>14.3f} {parallel_time:>16.3f} {simulations / min(single_time, parallel_time):>10.0f}")
+
+#modules whose import cost the imports benchmark tracks
+HEAVY_MODULES = ["xgboost", "sklearn", "scipy", "requests", "bs4", "lxml", "streamlit", "uvicorn"]
+
+def import_time(module, repeat=5):
+    '''
+    -----------------------------------------
+    Times importing a module in a fresh interpreter, keeping the best of
+    repeat runs, and lists the heavy dependencies it loaded
+    Use: seconds, loaded = import_time(module)
+    -----------------------------------------
+    '''
+    import json
+    import subprocess
+
+    code = (f"import sys, time, json; start = time.perf_counter(); import {module}; "
+            f"print(json.dumps([time.perf_counter() - start, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))")
+    best, loaded = None, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        seconds, loaded = json.loads(output.strip().splitlines()[-1])
+        best = seconds if best is None else min(best, seconds)
+    return best, loaded
+
+def bench_imports(modules=("cli", "metrics", "store", "standings", "simulation", "match_predictor",
+                           "service", "read_stats", "backtest")):
+    '''
+    -----------------------------------------
+    Measures cold import time of the entry points and the modules the app's
+    read-only views use, and the wall time of `python cli.py --help`
+    Use: python benchmark.py imports
+    -----------------------------------------
+    '''
+    import subprocess
+
+    print(f"{'module':>16} {'import (ms)':>12}  heavy dependencies")
+    for module in modules:
+        seconds, loaded = import_time(module)
+        print(f"{module:>16} {seconds * 1000:>12.1f}  {', '.join(loaded) or '-'}")
+
+    def help_command():
+        subprocess.run([sys.executable, "cli.py", "--help"], capture_output=True, check=True)
+    seconds, _ = timed(help_command, 5)
+    print(f"python cli.py --help: {seconds * 1000:.1f} ms")
+
+def bench_inference(batch_sizes=(1, 100, 100000)):
+    '''
+    -----------------------------------------
+    Compares per batch scoring latency of the xgboost path (predict_proba on a
+    pandas frame, then a row-wise apply for the winner) with the compiled
+    model (float32 array in, vectorized probabilities and winners out), for a
+    model trained on a synthetic league
+    Use: python benchmark.py inference
+    -----------------------------------------
+    '''
+    from store import normalize_matches
+    from features import rolling_features
+    from match_predictor import PREDICTORS, build_matchups, make_model
+    from compiled import CompiledModel, pick_winners
+
+    with redirect_stdout(io.StringIO()):
+        matchups, _ = build_matchups(rolling_features(normalize_matches(synthetic_league()), ROLLING_COLS))
+    model = make_model().fit(matchups[PREDICTORS], matchups["target"])
+    compiled = CompiledModel.from_model(model)
+
+    def xgboost_path(frame):
+        probs = model.predict_proba(frame[PREDICTORS])[:, 1]
+        scored = frame.assign(home_win_probability=probs)
+        return scored.apply(lambda row: row["home_team"] if row["home_win_probability"] >= 0.5 else row["away_team"], axis=1)
+
+    def compiled_path(x, home, away):
+        return pick_winners(compiled.predict_proba(x), home, away)
+
+    print(f"{'batch':>7} {'xgboost + apply (ms)':>21} {'compiled (ms)':>14} {'speedup':>8} {'max |diff|':>11}")
+    for batch_size in batch_sizes:
+        frame = matchups.sample(batch_size, replace=True, random_state=0).reset_index(drop=True)
+        x = frame[PREDICTORS].to_numpy(dtype=np.float32)
+        home, away = frame["home_team"].to_numpy(dtype=object), frame["away_team"].to_numpy(dtype=object)
+        repeat = 3 if batch_size >= 100000 else 20
+        xgboost_time, _ = timed(lambda: xgboost_path(frame), repeat)
+        compiled_time, _ = timed(lambda: compiled_path(x, home, away), repeat)
+        diff = np.abs(compiled.predict_proba(x) - model.predict_proba(frame[PREDICTORS])[:, 1]).max()
+        print(f"{batch_size:>7} {xgboost_time * 1000:>21.3f} {compiled_time * 1000:>14.3f} "
+              f"{xgboost_time / compiled_time:>7.1f}x {diff:>11.1e}")
+
+def fixture_pages(directory):
+    '''
+    -----------------------------------------
+    Loads saved team season pages as (schedule, game log) pairs: from a folder
+    of *_games.html / *_gamelog.html files, one schedule page (its game log
+    saved next to it), or the response cache when directory is "cache"
+    Use: pages = fixture_pages(directory)
+    -----------------------------------------
+    '''
+    import glob
+    from cache import ResponseCache
+
+    pages = []
+    if directory != "cache":
+        if os.path.isfile(directory):
+            paths = [directory]
+        else:
+            paths = sorted(glob.glob(os.path.join(directory, "**", "*_games.html"), recursive=True))
+        for path in paths:
+            gamelog_path = path.replace("_games.html", "_gamelog.html")
+            if os.path.exists(gamelog_path):
+                with open(path, encoding="utf-8") as f, open(gamelog_path, encoding="utf-8") as g:
+                    pages.append((f.read(), g.read()))
+        return pages
+
+    cache = ResponseCache()
+    urls = {entry["url"] for entry in cache.index.values()}
+    for url in sorted(urls):
+        gamelog_url = url.replace("_games.html", "_gamelog.html")
+        if "/teams/" in url and url.endswith("_games.html") and gamelog_url in urls:
+            schedule, gamelog = cache.get(url), cache.get(gamelog_url)
+            if schedule and gamelog:
+                pages.append((schedule["text"], gamelog["text"]))
+    return pages
+
+def bench_parse(directory=None, repeat=3):
+    '''
+    -----------------------------------------
+    Compares parsing team season pages with BeautifulSoup + read_html (the
+    old path) against the single lxml parse of read_team_pages, over pages
+    captured from the site (check_crawl.py --capture), or PAGE_FIXTURES: a
+    folder, one saved *_games.html page, or "cache" for the response cache;
+    without either it falls back to the hand-written pages, whose timings
+    say little about real, much larger pages
+    Use: python benchmark.py parse
+    -----------------------------------------
+    '''
+    from bs4 import BeautifulSoup
+    from fetcher import SYNTHETIC_FIXTURE_DIR, fixture_dir
+    from read_stats import read_team_pages, legacy_schedule, legacy_gamelog
+
+    directory = directory or os.environ.get("PAGE_FIXTURES") or fixture_dir()
+    pages = fixture_pages(directory)
+    if not pages:
+        print(f"No saved pages in {directory}, set PAGE_FIXTURES to a folder of *_games.html/*_gamelog.html pages, "
+              "one *_games.html page or cache")
+        return
+    if directory == SYNTHETIC_FIXTURE_DIR:
+        print("Hand-written pages, run python check_crawl.py --capture or set PAGE_FIXTURES for real page timings")
+
+    def soup_path():
+        for schedule, gamelog in pages:
+            soup = BeautifulSoup(schedule, features="lxml")
+            soup_game = BeautifulSoup(gamelog, features="lxml")
+            legacy_schedule(schedule)
+            legacy_gamelog(gamelog)
+            soup.select_one("a.button2.prev")
+            soup_game.select_one("a.button2.prev")
+
+    def lxml_path():
+        for schedule, gamelog in pages:
+            read_team_pages(schedule, gamelog)
+
+    schedule_size = sum(len(schedule) for schedule, gamelog in pages) / len(pages) / 1e3
+    gamelog_size = sum(len(gamelog) for schedule, gamelog in pages) / len(pages) / 1e3
+    soup_time, _ = timed(soup_path, repeat)
+    lxml_time, _ = timed(lxml_path, repeat)
+    print(f"{len(pages)} team seasons from {directory}, {schedule_size:.0f} kB schedule + {gamelog_size:.0f} kB game log per season")
+    print(f"{'path':>18} {'total (s)':>10} {'ms/season':>10}")
+    print(f"{'soup + read_html':>18} {soup_time:>10.3f} {soup_time / len(pages) * 1000:>10.2f}")
+    print(f"{'lxml single parse':>18} {lxml_time:>10.3f} {lxml_time / len(pages) * 1000:>10.2f}")
+    print(f"speedup {soup_time / lxml_time:.1f}x")
+
+def start_service(port=0):
+    '''
+    -----------------------------------------
+    Starts the prediction service with uvicorn on a background thread
+    Use: url, server = start_service()
+    -----------------------------------------
+    '''
+    import socket
+    import threading
+    import uvicorn
+
+    if port == 0:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config("service:app", host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+def load_test(url, batch_size, total_requests=500, concurrency=8):
+    '''
+    -----------------------------------------
+    Sends batches of random matchups to the service from several threads
+    Use: p50, p99, rps, gps = load_test(url, batch_size)
+    -----------------------------------------
+    Parameters:
+        url - (string) service base url
+        batch_size - (int) matchups per request
+        total_requests - (int) requests to send
+        concurrency - (int) client threads
+    Returns:
+        p50, p99 - (float) request latency in ms
+        rps - (float) requests per second
+        gps - (float) games scored per second
+    -----------------------------------------
+    '''
+    import random
+    import threading
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    teams = requests.get(f"{url}/teams").json()["teams"]
+    date = pd.Timestamp.today().strftime("%Y-%m-%d")
+    local = threading.local()
+
+    def one_request(_):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        games = [dict(zip(["home_team", "away_team"], random.sample(teams, 2)), date=date) for _ in range(batch_size)]
+        start = time.perf_counter()
+        response = session.post(f"{url}/predict", json={"games": games})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = np.array(list(pool.map(one_request, range(total_requests)))) * 1000
+    elapsed = time.perf_counter() - start
+    return np.percentile(latencies, 50), np.percentile(latencies, 99), total_requests / elapsed, total_requests * batch_size / elapsed
+
+def bench_service(url=None, batch_sizes=(1, 32, 256)):
+    '''
+    -----------------------------------------
+    Measures prediction service latency and throughput, starting a local
+    server unless url (or SERVICE_URL) points at a running one
+    Use: python benchmark.py service
+    -----------------------------------------
+    '''
+    url = url or os.environ.get("SERVICE_URL")
+    server = None
+    if url is None:
+        url, server = start_service()
+    print(f"{'batch':>6} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>8} {'games/s':>9}")
+    for batch_size in batch_sizes:
+        p50, p99, rps, gps = load_test(url, batch_size)
+        print(f"{batch_size:>6} {p50:>9.2f} {p99:>9.2f} {rps:>8.0f} {gps:>9.0f}")
+    if server is not None:
+        server.should_exit = True
+
+BENCHMARKS = {
+    "pipeline": bench_pipeline,
+    "rolling": bench_rolling,
+    "states": bench_states,
+    "simulate": bench_simulate,
+    "imports": bench_imports,
+    "inference": bench_inference,
+    "parse": bench_parse,
+    "service": bench_service,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"----- {name} -----")
+        BENCHMARKS[name]()
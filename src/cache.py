@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+CACHE_DIR = os.environ.get("HOCKEY_REF_CACHE", ".http_cache")
+CACHE_MAX_BYTES = int(os.environ.get("HOCKEY_REF_CACHE_BYTES", 200 * 1024 * 1024))
+
+#ttl for pages that can still change (current season), completed seasons never expire
+CURRENT_TTL = int(os.environ.get("HOCKEY_REF_CACHE_TTL", 60 * 60))
+
+#cache hits only update access times in memory, the index is saved after this many
+#and at exit so eviction in later processes still sees which pages were used recently
+INDEX_SAVE_EVERY = 50
+
+class ResponseCache:
+    '''
+    -----------------------------------------
+    Persistent response cache keyed by url hash, with ETag/Last-Modified
+    validators, per entry ttl (None never expires) and LRU eviction once
+    the stored bodies pass max_bytes
+    Use: cache = ResponseCache(); entry = cache.get(url)
+    -----------------------------------------
+    '''
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+        self.unsaved = 0
+        atexit.register(self.flush)
+
+    def key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def body_path(self, key):
+        return os.path.join(self.directory, f"{key}.html")
+
+    def save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+        self.unsaved = 0
+
+    def flush(self):
+        #saves access times recorded since the last save
+        with self.lock:
+            if self.unsaved:
+                self.save_index()
+
+    def get(self, url):
+        '''
+        -----------------------------------------
+        Gets the cached entry for a url
+        Use: entry = cache.get(url)
+        -----------------------------------------
+        Parameters:
+            url - (string) full url
+        Returns:
+            entry - (dict) metadata plus "text", None if not cached
+        -----------------------------------------
+        '''
+        key = self.key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            try:
+                with open(self.body_path(key), encoding="utf-8") as f:
+                    text = f.read()
+            except FileNotFoundError:
+                del self.index[key]
+                return None
+            entry["accessed"] = time.time()
+            self.unsaved += 1
+            if self.unsaved >= INDEX_SAVE_EVERY:
+                self.save_index()
+            return dict(entry, text=text)
+
+    def is_fresh(self, entry):
+        if entry["ttl"] is None:
+            return True
+        return time.time() - entry["fetched_at"] < entry["ttl"]
+
+    def put(self, url, text, headers, ttl):
+        '''
+        -----------------------------------------
+        Stores a response body and its validators, evicting old entries if over size
+        Use: cache.put(url, text, headers, ttl)
+        -----------------------------------------
+        Parameters:
+            url - (string) full url
+            text - (string) response body
+            headers - (mapping) response headers
+            ttl - (int) seconds until stale, None never expires
+        Returns:
+            None
+        -----------------------------------------
+        '''
+        key = self.key(url)
+        data = text.encode("utf-8")
+        with self.lock:
+            with open(self.body_path(key), "wb") as f:
+                f.write(data)
+            now = time.time()
+            self.index[key] = {
+                "url": url,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "fetched_at": now,
+                "accessed": now,
+                "ttl": ttl,
+                "size": len(data),
+            }
+            self.evict()
+            self.save_index()
+
+    def refresh(self, url, ttl):
+        '''
+        -----------------------------------------
+        Marks a cached entry as fresh again after a 304 Not Modified
+        Use: cache.refresh(url, ttl)
+        -----------------------------------------
+        '''
+        key = self.key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is not None:
+                entry["fetched_at"] = time.time()
+                entry["ttl"] = ttl
+                self.save_index()
+
+    def evict(self):
+        #drop least recently used bodies until under the size cap (caller holds lock)
+        total = sum(entry["size"] for entry in self.index.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]["accessed"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.body_path(key))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del self.index[key]
+            self.stats["evictions"] += 1
+
+    def record(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def clear(self):
+        '''
+        -----------------------------------------
+        Removes every cached response
+        Use: cache.clear()
+        -----------------------------------------
+        '''
+        with self.lock:
+            for key in list(self.index):
+                try:
+                    os.remove(self.body_path(key))
+                except FileNotFoundError:
+                    pass
+            self.index = {}
+            self.save_index()
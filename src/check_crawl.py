@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import argparse
+import pandas as pd
+from io import StringIO
+from datetime import datetime
+from urllib.parse import urlsplit
+from lxml import etree, html
+
+from fetcher import FIXTURE_DIR, FIXTURE_MANIFEST, fetch, fixture_dir, site_url, use_fixtures
+from games import validate_games, report_summary
+from read_stats import FIRST_SEASON, past_stats, current_season, league_games, team_links
+from tables import page_links, parse_page
+
+#captured by default: two franchises whose abbreviation has not changed since FIRST_SEASON
+CAPTURE_TEAMS = ["TOR", "MTL"]
+
+def team_abbreviation(href):
+    found = re.search(r"/teams/([A-Z]{3})/", href or "")
+    return found.group(1) if found else None
+
+def trim_page(text, keep_row=None):
+    '''
+    -----------------------------------------
+    Shrinks a captured page without touching the markup the crawl reads:
+    drops scripts, styles and comments, and the table rows keep_row rejects
+    Use: text = trim_page(text, keep_row)
+    -----------------------------------------
+    Parameters:
+        text - (string) page html
+        keep_row - (function) called with each table body row, False drops it;
+                   None keeps every row
+    Returns:
+        text - (string) trimmed html
+    -----------------------------------------
+    '''
+    tree = parse_page(text)
+    for element in tree.xpath("//script | //style | //noscript | //svg | //comment()"):
+        element.drop_tree() if isinstance(element, html.HtmlElement) else element.getparent().remove(element)
+    if keep_row is not None:
+        for row in tree.xpath("//table/tbody/tr"):
+            if not keep_row(row):
+                row.getparent().remove(row)
+    return etree.tostring(tree, method="html", encoding="unicode")
+
+def capture_pages(teams=CAPTURE_TEAMS, current_year=None, directory=FIXTURE_DIR, progress=print):
+    '''
+    -----------------------------------------
+    Saves the site's pages the crawl reads for a few teams, FIRST_SEASON to
+    the current season, as check_crawl fixtures: league standings and
+    schedule pages trimmed to games of those teams, their team, schedule and
+    game log pages whole apart from scripts and comments, and a manifest of
+    where each page came from
+    Use: python check_crawl.py --capture TOR MTL
+    -----------------------------------------
+    Parameters:
+        teams - (list) team abbreviations, e.g. TOR
+        current_year - (int) year the current season ends, defaults to today's
+        directory - (string) fixture folder, replaced page by page
+        progress - (function) called with each saved page
+    Returns:
+        manifest - (dict) source, capture time, teams, years and pages
+    -----------------------------------------
+    '''
+    if current_year is None:
+        current_year = datetime.now().year + 1
+        if datetime.now().month < 4:
+            current_year -= 1
+    pages = []
+
+    def save(url, text, keep_row=None):
+        path = os.path.join(directory, urlsplit(url).path.lstrip("/"))
+        trimmed = trim_page(text, keep_row)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(trimmed)
+        pages.append({"path": os.path.relpath(path, directory), "url": url, "fetched_bytes": len(text), "saved_bytes": len(trimmed)})
+        progress(f"Saved {url} ({len(text) / 1e3:.0f} kB, {len(trimmed) / 1e3:.0f} kB trimmed)")
+
+    for year in range(FIRST_SEASON, current_year + 1):
+        standings_url = site_url(f"/leagues/NHL_{year}.html")
+        team_urls, team_names = team_links(standings_url)
+        captured = {team_abbreviation(url): (url, name) for url, name in zip(team_urls, team_names)
+                    if team_abbreviation(url) in teams}
+        missing = sorted(set(teams) - set(captured))
+        if missing:
+            raise ValueError(f"No {', '.join(missing)} on the {year} standings page")
+        names = {name for url, name in captured.values()}
+
+        #standings rows of other teams and games between other teams are dropped
+        save(standings_url, fetch(standings_url),
+             lambda row: not row.xpath(".//a[contains(@href, '/teams/')]") or
+                         any(team_abbreviation(href) in teams for href in row.xpath(".//a/@href")))
+        games_url = site_url(f"/leagues/NHL_{year}_games.html")
+        save(games_url, fetch(games_url),
+             lambda row: row.get("class") == "thead" or any(cell.text_content().strip() in names for cell in row))
+
+        for abbreviation, (team_url, name) in sorted(captured.items()):
+            team_page = fetch(team_url)
+            save(team_url, team_page)
+            links = page_links(parse_page(team_page))
+            for link in [links["schedule"], links["gamelog"]]:
+                save(site_url(link), fetch(site_url(link)))
+
+    manifest = {
+        "source": site_url(""),
+        "captured": datetime.now().isoformat(timespec="seconds"),
+        "teams": sorted(teams),
+        "first_year": FIRST_SEASON,
+        "current_year": current_year,
+        "pages": pages,
+    }
+    with open(os.path.join(directory, FIXTURE_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def league_scores(year, teams):
+    '''
+    -----------------------------------------
+    Gets the goals for and against of every game of the given teams from the
+    league schedule page, parsed separately from the team pages the crawl reads
+    Use: scores = league_scores(year, teams)
+    -----------------------------------------
+    '''
+    games = pd.read_html(StringIO(fetch(site_url(f"/leagues/NHL_{year}_games.html"))), attrs={"id": "games"})[0]
+    games = games[games["Date"] != "Date"]
+    games["date"] = pd.to_datetime(games["Date"])
+    goals = games.columns[[3, 5]]
+    home = pd.DataFrame({"date": games["date"], "team": games["Home"], "gf": games[goals[1]], "ga": games[goals[0]]})
+    away = pd.DataFrame({"date": games["date"], "team": games["Visitor"], "gf": games[goals[0]], "ga": games[goals[1]]})
+    scores = pd.concat([home, away], ignore_index=True).assign(season=f"{year-1}-{year}")
+    scores[["gf", "ga"]] = scores[["gf", "ga"]].apply(pd.to_numeric, errors="coerce")
+    return scores[scores["team"].isin(teams)]
+
+def check_season_rows(crawled, scores, label):
+    '''
+    -----------------------------------------
+    Asserts the crawl has one row per team game on the league page, with the
+    same score, and that every game between two crawled teams pairs a home
+    and an away row
+    Use: check_season_rows(crawled, scores, label)
+    -----------------------------------------
+    '''
+    crawled = crawled.assign(date=pd.to_datetime(crawled["date"]))
+    merged = scores.merge(crawled, on=["season", "team", "date"], how="outer", suffixes=("_league", ""), indicator=True)
+    assert (merged["_merge"] == "both").all(), f"{label}: crawled rows and league page disagree\n{merged[merged['_merge'] != 'both']}"
+    assert len(crawled) == len(scores), f"{label}: {len(crawled)} rows crawled, {len(scores)} on the league page"
+    for col in ["gf", "ga"]:
+        same = merged[col].eq(merged[f"{col}_league"]) | (merged[col].isna() & merged[f"{col}_league"].isna())
+        assert same.all(), f"{label}: {col} differs from the league page\n{merged[~same]}"
+    summary = report_summary(validate_games(crawled[crawled["opponent"].isin(crawled["team"])]))
+    assert summary is None, f"{label}: {summary}"
+
+def check_crawl(directory=None):
+    '''
+    -----------------------------------------
+    Runs the past and current season crawls against saved pages served
+    locally and checks the rows they parse against the league schedule pages
+    Use: python check_crawl.py
+    -----------------------------------------
+    Parameters:
+        directory - (string) folder with saved pages and their manifest, defaults
+                    to the captured pages, or the hand-written ones if none are captured
+    Returns:
+        None
+    Raises:
+        AssertionError - the crawl parsed rows that do not match the pages
+    -----------------------------------------
+    '''
+    directory = directory or fixture_dir()
+    with open(os.path.join(directory, FIXTURE_MANIFEST)) as f:
+        manifest = json.load(f)
+    current_year = manifest["current_year"]
+    print(f"Pages in {directory}: {manifest['source']}" + (f", captured {manifest['captured']}" if "captured" in manifest else ""))
+
+    server = use_fixtures(directory)
+    try:
+        past = past_stats(progress=lambda message: None, current_year=current_year - 1)
+        current = current_season(progress=lambda message: None, season_year=current_year)
+        teams = set(past["team"]) | set(current["team"])
+
+        past_scores = pd.concat([league_scores(year, teams) for year in range(manifest["first_year"], current_year)], ignore_index=True)
+        check_season_rows(past, past_scores, "past seasons")
+        check_season_rows(current, league_scores(current_year, teams), "current season")
+
+        #completed games carry their game log stats, unplayed ones have no result yet
+        played = current["result"].notna()
+        schedule = league_games(current_year)
+        completed = schedule.loc[schedule["team"].isin(teams), "completed"]
+        assert played.sum() == completed.sum(), f"{played.sum()} games with results, {completed.sum()} completed on the league page"
+        stats = ["sog_for", "sog_against", "pim_for", "pim_against", "ppg_for", "ppg_against", "ppo_for", "ppo_against"]
+        assert past[stats].notna().all().all() and current.loc[played, stats].notna().all().all(), "completed games are missing game log stats"
+    finally:
+        server.shutdown()
+    print(f"Crawl matches the saved pages: {len(teams)} teams, {len(past)} past rows, "
+          f"{len(current)} current season rows ({played.sum()} played)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the crawl against saved pages served locally")
+    parser.add_argument("--fixtures", default=None, help="folder with saved pages (default: captured pages, else the hand-written ones)")
+    parser.add_argument("--capture", nargs="*", metavar="TEAM",
+                        help=f"first save the site's pages for these teams into {FIXTURE_DIR} (default: {' '.join(CAPTURE_TEAMS)})")
+    args = parser.parse_args()
+
+    if args.capture is not None:
+        capture_pages(args.capture or CAPTURE_TEAMS, directory=args.fixtures or FIXTURE_DIR)
+    check_crawl(args.fixtures)
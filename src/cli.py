@@ -0,0 +1,98 @@
+import argparse
+
+#every command imports what it needs when it runs, so `python cli.py --help` and
+#light commands start without loading xgboost, scikit-learn or the scraper
+
+def update(args):
+    '''
+    -----------------------------------------
+    Scrapes new games into the match store, or backfills past seasons
+    Use: python cli.py update [--full] [--backfill START END]
+    -----------------------------------------
+    '''
+    if args.backfill:
+        from backfill import backfill
+        backfill(*args.backfill, workers=args.workers)
+    else:
+        from read_stats import read_stats
+        read_stats(full=args.full)
+
+def predict(args):
+    '''
+    -----------------------------------------
+    Predicts upcoming games, writing predictions.csv, and optionally projects
+    the final standings from them
+    Use: python cli.py predict [--refit] [--simulations N]
+    -----------------------------------------
+    '''
+    from match_predictor import load_match_history, run_predictions
+
+    matches = load_match_history()
+    eval_df, prob_pred_df, high_conf = run_predictions(matches, incremental=not args.refit)
+    if args.simulations and not prob_pred_df.empty:
+        from simulation import simulate_season
+        projections = simulate_season(prob_pred_df, matches, simulations=args.simulations, workers=args.workers)
+        print("----- Season Projections -----")
+        print(projections.to_string(index=False, float_format="%.3f"))
+
+def backtest(args):
+    '''
+    -----------------------------------------
+    Runs the walk-forward backtest
+    Use: python cli.py backtest [--step-games N] [--min-train N]
+    -----------------------------------------
+    '''
+    from backtest import run_backtest, report_backtest
+    report_backtest(*run_backtest(min_train=args.min_train, step_games=args.step_games, workers=args.workers))
+
+def serve(args):
+    '''
+    -----------------------------------------
+    Serves the prediction api with uvicorn
+    Use: python cli.py serve [--host HOST] [--port PORT]
+    -----------------------------------------
+    '''
+    import uvicorn
+    uvicorn.run("service:app", host=args.host, port=args.port)
+
+def build_parser():
+    '''
+    -----------------------------------------
+    Builds the command line parser with one subcommand per task
+    Use: args = build_parser().parse_args()
+    -----------------------------------------
+    '''
+    parser = argparse.ArgumentParser(description="NHL match predictor (run from src)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("update", help="scrape new games into the match store")
+    command.add_argument("--full", action="store_true", help="re-scrape the whole current season")
+    command.add_argument("--backfill", type=int, nargs=2, metavar=("START", "END"),
+                         help="backfill seasons START to END, by the year they end")
+    command.add_argument("--workers", type=int, default=None, help="parsing processes for --backfill")
+    command.set_defaults(handler=update)
+
+    command = commands.add_parser("predict", help="predict upcoming games")
+    command.add_argument("--refit", action="store_true", help="refit the model instead of updating it with new games")
+    command.add_argument("--simulations", type=int, default=0, help="also simulate the season this many times")
+    command.add_argument("--workers", type=int, default=None, help="simulation processes")
+    command.set_defaults(handler=predict)
+
+    command = commands.add_parser("backtest", help="walk-forward backtest of the model")
+    command.add_argument("--step-games", type=int, default=None, help="games per fold (default: weekly folds)")
+    command.add_argument("--min-train", type=int, default=500, help="games in the first training window")
+    command.add_argument("--workers", type=int, default=None, help="worker processes")
+    command.set_defaults(handler=backtest)
+
+    command = commands.add_parser("serve", help="serve the prediction api")
+    command.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    command.add_argument("--port", type=int, default=8000, help="port to listen on")
+    command.set_defaults(handler=serve)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import os
+import json
+import numpy as np
+
+from model_registry import MODEL_DIR, model_paths
+
+#prediction backend: xgboost (the trained estimator) or compiled (numpy tree arrays, no xgboost needed)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "xgboost")
+
+#rows scored at once, keeps the rows x trees working arrays in cache
+CHUNK_ROWS = 4096
+
+def compiled_path(name, directory=MODEL_DIR):
+    return os.path.join(directory, f"{name}.npz")
+
+def flatten_trees(model_json):
+    '''
+    -----------------------------------------
+    Lays every tree of a saved xgboost model (json) out as a complete binary
+    tree of the model's depth in heap order (children of node i at 2i+1 and
+    2i+2), leaves above the bottom copied down both sides, so scoring is the
+    same few array gathers per level for every row and tree
+    Use: arrays = flatten_trees(json.load(f))
+    -----------------------------------------
+    Parameters:
+        model_json - (dict) parsed xgboost json model of a binary:logistic gbtree
+    Returns:
+        arrays - (dict) trees x splits feature, threshold, default_left; trees x leaves
+                 leaf values; base_margin, num_feature
+    Raises:
+        ValueError - the model is not a binary:logistic gbtree with numeric splits
+    -----------------------------------------
+    '''
+    learner = model_json["learner"]
+    booster = learner["gradient_booster"]
+    if learner["objective"]["name"] != "binary:logistic" or booster["name"] != "gbtree":
+        raise ValueError(f"Only binary:logistic gbtree models compile, not {learner['objective']['name']} {booster['name']}")
+    trees = booster["model"]["trees"]
+    if any(any(tree["split_type"]) for tree in trees):
+        raise ValueError("Categorical splits do not compile")
+
+    def tree_depth(tree, node=0):
+        if tree["left_children"][node] < 0:
+            return 0
+        return 1 + max(tree_depth(tree, tree["left_children"][node]), tree_depth(tree, tree["right_children"][node]))
+
+    depth = max((tree_depth(tree) for tree in trees), default=0)
+    splits = 2 ** depth - 1
+    feature = np.zeros((len(trees), splits), dtype=np.int32)
+    threshold = np.zeros((len(trees), splits), dtype=np.float32)
+    default_left = np.zeros((len(trees), splits), dtype=bool)
+    leaf = np.zeros((len(trees), 2 ** depth), dtype=np.float32)
+
+    for t, tree in enumerate(trees):
+        stack = [(0, 0, 0)]
+        while stack:
+            node, position, level = stack.pop()
+            left = tree["left_children"][node]
+            if level == depth:
+                #at leaves split_conditions holds the leaf value
+                leaf[t, position - splits] = tree["split_conditions"][node]
+            elif left < 0:
+                #a leaf above the bottom: both sides lead to copies of it
+                stack += [(node, 2 * position + 1, level + 1), (node, 2 * position + 2, level + 1)]
+            else:
+                feature[t, position] = tree["split_indices"][node]
+                threshold[t, position] = tree["split_conditions"][node]
+                default_left[t, position] = tree["default_left"][node]
+                stack += [(left, 2 * position + 1, level + 1), (tree["right_children"][node], 2 * position + 2, level + 1)]
+
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    return {
+        "feature": feature,
+        "threshold": threshold,
+        "default_left": default_left,
+        "leaf": leaf,
+        "base_margin": np.float32(np.log(base_score / (1 - base_score))),
+        "num_feature": np.int32(learner["learner_model_param"]["num_feature"]),
+    }
+
+def export_compiled(name, directory=MODEL_DIR):
+    '''
+    -----------------------------------------
+    Compiles a saved registry model into numpy tree arrays next to it,
+    skipping it when the compiled file is newer than the model
+    Use: path = export_compiled(name)
+    -----------------------------------------
+    Parameters:
+        name - (string) registry name, e.g. predict
+        directory - (string) registry folder
+    Returns:
+        path - (string) compiled model file (.npz)
+    -----------------------------------------
+    '''
+    model_path = model_paths(name, directory)[0]
+    path = compiled_path(name, directory)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(model_path):
+        return path
+    with open(model_path) as f:
+        arrays = flatten_trees(json.load(f))
+    #np.savez adds .npz to names without it, so the temporary name keeps the suffix
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+class CompiledModel:
+    '''
+    -----------------------------------------
+    Scores float32 feature matrices with a compiled booster: every row walks
+    every tree at once, one level per step, so a batch costs a few vectorized
+    gathers per tree level whatever its size
+    Use: model = CompiledModel.load("predict"); probs = model.predict_proba(x)
+    -----------------------------------------
+    '''
+    def __init__(self, arrays):
+        self.trees, splits = arrays["feature"].shape
+        self.depth = int(np.log2(splits + 1))
+        #flat arrays, tree t's nodes start at t * splits (t * leaves for the leaf values)
+        self.feature = np.asarray(arrays["feature"], dtype=np.intp).ravel()
+        self.threshold = np.asarray(arrays["threshold"], dtype=np.float32).ravel()
+        self.default_left = np.asarray(arrays["default_left"], dtype=bool).ravel()
+        self.leaf = np.asarray(arrays["leaf"], dtype=np.float32).ravel()
+        self.split_start = np.arange(self.trees, dtype=np.intp) * splits
+        self.leaf_start = np.arange(self.trees, dtype=np.intp) * (splits + 1) - splits
+        self.base_margin = np.float32(arrays["base_margin"])
+        self.num_feature = int(arrays["num_feature"])
+
+    @classmethod
+    def load(cls, name, directory=MODEL_DIR):
+        with np.load(export_compiled(name, directory)) as arrays:
+            return cls(dict(arrays))
+
+    @classmethod
+    def from_model(cls, model):
+        '''
+        -----------------------------------------
+        Compiles a trained estimator or booster in memory
+        Use: compiled = CompiledModel.from_model(model)
+        -----------------------------------------
+        '''
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        return cls(flatten_trees(json.loads(booster.save_raw("json"))))
+
+    def margins(self, x):
+        row_start = (np.arange(len(x), dtype=np.intp) * self.num_feature)[:, None]
+        values = x.ravel()
+        missing = np.isnan(values).any()
+        node = np.zeros((len(x), self.trees), dtype=np.intp)
+        for _ in range(self.depth):
+            split = self.split_start + node
+            value = values[row_start + self.feature[split]]
+            #xgboost goes left when value < threshold, missing values follow default_left
+            right = ~(value < self.threshold[split])
+            if missing:
+                right &= ~(np.isnan(value) & self.default_left[split])
+            node = 2 * node + 1 + right
+        return self.leaf[self.leaf_start + node].sum(axis=1, dtype=np.float32) + self.base_margin
+
+    def predict_proba(self, x):
+        '''
+        -----------------------------------------
+        Gets the home win probability of every row
+        Use: probs = model.predict_proba(x)
+        -----------------------------------------
+        Parameters:
+            x - (ndarray) rows x predictors, converted to contiguous float32 if it is not
+        Returns:
+            probs - (ndarray) float32 home win probabilities
+        -----------------------------------------
+        '''
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if x.ndim != 2 or x.shape[1] != self.num_feature:
+            raise ValueError(f"Expected rows x {self.num_feature} predictors, got {x.shape}")
+        margins = np.concatenate([self.margins(x[start:start + CHUNK_ROWS])
+                                  for start in range(0, len(x), CHUNK_ROWS)]) if len(x) else np.zeros(0, dtype=np.float32)
+        return (1 / (1 + np.exp(-margins))).astype(np.float32)
+
+def pick_winners(probs, home_teams, away_teams):
+    '''
+    -----------------------------------------
+    Picks the predicted winner of every game at once
+    Use: winners = pick_winners(probs, home_teams, away_teams)
+    -----------------------------------------
+    '''
+    return np.where(np.asarray(probs) >= 0.5, np.asarray(home_teams, dtype=object), np.asarray(away_teams, dtype=object))
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOW = 5
+ROLLING_COLS = ["gf","ga","sog_for","sog_against","pim_for","pim_against"]
+
+def feature_name(col, window):
+    '''
+    -----------------------------------------
+    Gets the rolling average column name for a stat and window, the default
+    window keeps the original {col}_rolling names
+    Use: name = feature_name(col, window)
+    -----------------------------------------
+    '''
+    if window == DEFAULT_WINDOW:
+        return f"{col}_rolling"
+    return f"{col}_rolling_{window}"
+
+def window_means(values, starts, window):
+    '''
+    -----------------------------------------
+    Means of the previous window rows (current row excluded) for every column
+    at once, using prefix sums that restart at each team's first row
+    Use: means = window_means(values, starts, window)
+    -----------------------------------------
+    Parameters:
+        values - (ndarray) rows x stats, sorted by team then date
+        starts - (ndarray) index of each row's team's first row
+        window - (int) number of previous games to average
+    Returns:
+        means - (ndarray) rows x stats, NaN until window previous games have stats
+    -----------------------------------------
+    '''
+    rows = values.shape[0]
+    present = ~np.isnan(values)
+    sums = np.zeros((rows + 1, values.shape[1]))
+    counts = np.zeros((rows + 1, values.shape[1]))
+    np.cumsum(np.where(present, values, 0.0), axis=0, out=sums[1:])
+    np.cumsum(present, axis=0, out=counts[1:])
+
+    #window covers rows [lo, i) clipped to the team's first row
+    index = np.arange(rows)
+    lo = np.maximum(index - window, starts)
+    window_sum = sums[index] - sums[lo]
+    window_count = counts[index] - counts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = window_sum / window_count
+    means[window_count < window] = np.nan
+    return means
+
+def rolling_features(matches, cols, windows=(DEFAULT_WINDOW,), spans=(), today=None):
+    '''
+    -----------------------------------------
+    Calculates rolling averages of previous games for every team in one pass:
+    one global sort, then prefix sum windows and grouped EWMAs
+    Use: matches = rolling_features(matches, cols, windows, spans)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) all match data
+        cols - (array) regular prediction columns
+        windows - (array) rolling window sizes, e.g. (3, 5, 10)
+        spans - (array) EWMA spans, adds {col}_ewm_{span} columns
+        today - (timestamp) past games missing any average are dropped, defaults to today
+    Returns:
+        matches - (dataframe) sorted by team and date with added float32 rolling average columns
+    -----------------------------------------
+    '''
+    if today is None:
+        today = pd.Timestamp.today().normalize()
+
+    matches = matches.sort_values(["team", "date"], kind="stable", ignore_index=True)
+    team = matches["team"]
+    codes = team.cat.codes.to_numpy() if isinstance(team.dtype, pd.CategoricalDtype) else pd.factorize(team)[0]
+    first = np.r_[True, codes[1:] != codes[:-1]]
+    starts = np.maximum.accumulate(np.where(first, np.arange(len(codes)), 0))
+
+    values = matches[cols].to_numpy(dtype=float)
+    new_cols = []
+    features = {}
+    for window in windows:
+        means = window_means(values, starts, window)
+        for i, col in enumerate(cols):
+            features[feature_name(col, window)] = means[:, i].astype(np.float32)
+    new_cols += list(features)
+
+    if spans:
+        group_ids = pd.Series(np.cumsum(first), index=matches.index)
+        previous = matches[cols].groupby(group_ids).shift(1)
+        for span in spans:
+            ewm = previous.groupby(group_ids).ewm(span=span, min_periods=1).mean().reset_index(level=0, drop=True)
+            for col in cols:
+                name = f"{col}_ewm_{span}"
+                features[name] = ewm[col].to_numpy(dtype=np.float32)
+                new_cols.append(name)
+
+    matches = pd.concat([matches, pd.DataFrame(features, index=matches.index)], axis=1)
+    incomplete = np.isnan(matches[new_cols].to_numpy()).any(axis=1)
+    matches = matches[~((matches["date"] < today).to_numpy() & incomplete)]
+    matches.index = range(matches.shape[0])
+    return matches
@@ -0,0 +1,353 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import ResponseCache
+from metrics import record_request
+
+#base url can be pointed at a local stand-in (see serve_fixtures) for testing
+BASE_URL = os.environ.get("HOCKEY_REF_URL", "https://www.hockey-reference.com").rstrip("/")
+
+#hockey-reference allows roughly 20 requests a minute, stay just under it
+REQUEST_RATE = float(os.environ.get("HOCKEY_REF_RATE", 0.33))
+REQUEST_BURST = int(os.environ.get("HOCKEY_REF_BURST", 3))
+MAX_WORKERS = int(os.environ.get("HOCKEY_REF_WORKERS", 8))
+PER_HOST_LIMIT = int(os.environ.get("HOCKEY_REF_PER_HOST", 4))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+#saved site pages (see serve_fixtures), relative to src: pages captured from the site
+#with check_crawl.py --capture, and hand-written pages in the site's layout
+FIXTURE_DIR = "fixtures/site"
+SYNTHETIC_FIXTURE_DIR = "fixtures/synthetic"
+#where a fixture folder's pages came from, written next to them
+FIXTURE_MANIFEST = "manifest.json"
+
+def site_url(path):
+    '''
+    -----------------------------------------
+    Builds a full url for a path on the stats site
+    Use: url = site_url(path)
+    -----------------------------------------
+    Parameters:
+        path - (string) site relative path, e.g. /leagues/NHL_2025.html
+    Returns:
+        url - (string) absolute url using BASE_URL
+    -----------------------------------------
+    '''
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    return f"{BASE_URL}{path}"
+
+class TokenBucket:
+    '''
+    -----------------------------------------
+    Thread safe token bucket, refills at rate tokens per second up to capacity
+    Use: bucket = TokenBucket(rate, capacity); bucket.acquire()
+    -----------------------------------------
+    '''
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        -----------------------------------------
+        Blocks until a token is available and takes it
+        -----------------------------------------
+        '''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class Fetcher:
+    '''
+    -----------------------------------------
+    Shared fetch engine: bounded thread pool, token bucket rate limit,
+    per host concurrency limit, pooled keep-alive sessions, retry with
+    backoff on 429/5xx responses and an optional on-disk response cache
+    Use: fetcher = Fetcher(); text = fetcher.get(url)
+    -----------------------------------------
+    '''
+    def __init__(self, rate=REQUEST_RATE, burst=REQUEST_BURST, max_workers=MAX_WORKERS,
+                 per_host=PER_HOST_LIMIT, retries=4, backoff=2.0, timeout=30, cache=None):
+        self.cache = cache
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+        self.host_limits = {}
+        self.host_lock = threading.Lock()
+        self.executor = None
+
+    def session(self):
+        '''
+        -----------------------------------------
+        Gets this thread's keep-alive session (requests.Session is not thread safe)
+        -----------------------------------------
+        '''
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.per_host, pool_maxsize=self.per_host)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.local.session = session
+        return session
+
+    def host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self.host_lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self.host_limits[host]
+
+    def retry_wait(self, response, attempt):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt) + random.uniform(0, 1)
+
+    def request(self, url, headers=None):
+        '''
+        -----------------------------------------
+        Gets a url, retrying on 429/5xx responses and connection errors
+        Use: response = fetcher.request(url)
+        -----------------------------------------
+        Parameters:
+            url - (string) full url or site relative path
+            headers - (dict) extra request headers
+        Returns:
+            response - (requests.Response) final response
+        -----------------------------------------
+        '''
+        url = site_url(url)
+        self.local.retries = 0
+        for attempt in range(self.retries + 1):
+            response = None
+            with self.host_limit(url):
+                self.bucket.acquire()
+                try:
+                    response = self.session().get(url, headers=headers, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+            if response is not None and response.status_code not in RETRY_STATUS:
+                if response.status_code != 304:
+                    response.raise_for_status()
+                return response
+            if attempt == self.retries:
+                response.raise_for_status()
+            self.local.retries = attempt + 1
+            time.sleep(self.retry_wait(response, attempt))
+
+    def get(self, url, ttl=None):
+        '''
+        -----------------------------------------
+        Gets the text of a page, served from the cache while fresh and
+        revalidated with ETag/Last-Modified once stale
+        Use: text = fetcher.get(url, ttl)
+        -----------------------------------------
+        Parameters:
+            url - (string) full url or site relative path
+            ttl - (int) seconds the page stays fresh, None never expires
+        Returns:
+            text - (string) page html
+        -----------------------------------------
+        '''
+        url = site_url(url)
+        start = time.perf_counter()
+        try:
+            text, cache, status = self.lookup(url, ttl)
+        except Exception:
+            record_request(url, "error", time.perf_counter() - start, 0, getattr(self.local, "retries", 0))
+            raise
+        retries = 0 if cache == "hit" else self.local.retries
+        record_request(url, cache, time.perf_counter() - start, len(text), retries, status)
+        return text
+
+    def lookup(self, url, ttl):
+        '''
+        -----------------------------------------
+        Gets a page through the cache
+        Use: text, cache, status = fetcher.lookup(url, ttl)
+        -----------------------------------------
+        Returns:
+            text - (string) page html
+            cache - (string) hit, revalidated, miss or uncached
+            status - (int) http status, None for cache hits
+        -----------------------------------------
+        '''
+        if self.cache is None:
+            response = self.request(url)
+            return response.text, "uncached", response.status_code
+
+        entry = self.cache.get(url)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.record("hits")
+            return entry["text"], "hit", None
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        response = self.request(url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.cache.record("revalidated")
+            self.cache.refresh(url, ttl)
+            return entry["text"], "revalidated", 304
+        if response.status_code == 304:
+            #no cached copy to reuse (e.g. a server answering 304 to a plain request),
+            #ask again without validators rather than storing an empty page
+            response = self.request(url, headers={"Cache-Control": "no-cache"})
+            if response.status_code == 304:
+                raise requests.HTTPError(f"304 Not Modified for {url} with no cached copy", response=response)
+
+        self.cache.record("misses")
+        self.cache.put(url, response.text, response.headers, ttl)
+        return response.text, "miss", response.status_code
+
+    def map(self, fn, items):
+        '''
+        -----------------------------------------
+        Runs fn over items on the fetch thread pool, keeping input order
+        Use: results = fetcher.map(fn, items)
+        -----------------------------------------
+        '''
+        return list(self.pool().map(fn, items))
+
+    def submit(self, fn, *args):
+        '''
+        -----------------------------------------
+        Schedules fn(*args) on the fetch thread pool
+        Use: future = fetcher.submit(fn, *args)
+        -----------------------------------------
+        '''
+        return self.pool().submit(fn, *args)
+
+    def pool(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+_fetcher = None
+
+def get_fetcher():
+    '''
+    -----------------------------------------
+    Gets the process wide fetcher so all crawls share one request budget
+    Use: fetcher = get_fetcher()
+    -----------------------------------------
+    '''
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = Fetcher(cache=ResponseCache())
+    return _fetcher
+
+def fetch(url, ttl=None):
+    '''
+    -----------------------------------------
+    Gets the text of a page using the shared fetcher
+    Use: text = fetch(url, ttl)
+    -----------------------------------------
+    Parameters:
+        url - (string) full url or site relative path
+        ttl - (int) seconds a cached copy stays fresh, None never expires
+    Returns:
+        text - (string) page html
+    -----------------------------------------
+    '''
+    return get_fetcher().get(url, ttl)
+
+def cache_stats():
+    '''
+    -----------------------------------------
+    Gets response cache counters for this process
+    Use: stats = cache_stats()
+    -----------------------------------------
+    Parameters:
+        None
+    Returns:
+        stats - (dict) hits, misses, revalidated and evictions counts
+    -----------------------------------------
+    '''
+    cache = get_fetcher().cache
+    return dict(cache.stats) if cache is not None else {}
+
+def fixture_dir():
+    '''
+    -----------------------------------------
+    Gets the folder of captured site pages, or the hand-written pages when
+    none have been captured
+    Use: directory = fixture_dir()
+    -----------------------------------------
+    '''
+    if os.path.exists(os.path.join(FIXTURE_DIR, FIXTURE_MANIFEST)):
+        return FIXTURE_DIR
+    return SYNTHETIC_FIXTURE_DIR
+
+def serve_fixtures(directory, port=8000):
+    '''
+    -----------------------------------------
+    Serves saved html pages as a local stand-in for the stats site, paths
+    mirror the site, e.g. directory/leagues/NHL_2025.html
+    Run with HOCKEY_REF_URL=http://localhost:8000 (and a high HOCKEY_REF_RATE)
+    Use: server = serve_fixtures(directory); ...; server.shutdown()
+    -----------------------------------------
+    Parameters:
+        directory - (string) folder with saved pages
+        port - (int) port to listen on, 0 picks a free port
+    Returns:
+        server - (ThreadingHTTPServer) running in a daemon thread
+    -----------------------------------------
+    '''
+    from functools import partial
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def use_fixtures(directory):
+    '''
+    -----------------------------------------
+    Points this process at saved pages: serves them locally and swaps the
+    shared fetcher for one without rate limiting or the response cache
+    Use: server = use_fixtures("fixtures"); ...; server.shutdown()
+    -----------------------------------------
+    Parameters:
+        directory - (string) folder with saved pages, laid out like the site
+    Returns:
+        server - (ThreadingHTTPServer) running in a daemon thread
+    -----------------------------------------
+    '''
+    global BASE_URL, _fetcher
+    server = serve_fixtures(directory, port=0)
+    BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    _fetcher = Fetcher(rate=1000, burst=100, retries=0, cache=None)
+    return server
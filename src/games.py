@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+def game_ids(matches):
+    '''
+    -----------------------------------------
+    Gets the stable id of each team row's game, date + home team + away team,
+    so a game's home and away rows share one id
+    Use: matches["game_id"] = game_ids(matches)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) one row per team per game with date, venue, team, opponent
+    Returns:
+        ids - (series) game ids aligned with matches
+    -----------------------------------------
+    '''
+    team = matches["team"].astype(str)
+    opponent = matches["opponent"].astype(str)
+    home = matches["venue"] == "Home"
+    home_team = team.where(home, opponent)
+    away_team = opponent.where(home, team)
+    date = pd.to_datetime(matches["date"]).dt.strftime("%Y-%m-%d")
+    return date + "_" + home_team + "_" + away_team
+
+def pair_games(matches):
+    '''
+    -----------------------------------------
+    Pairs each game's home row with its away row by game id
+    Use: home_pos, away_pos, report = pair_games(matches)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) match data with venue and game_id columns
+    Returns:
+        home_pos - (ndarray) row positions of paired home rows
+        away_pos - (ndarray) row positions of the matching away rows
+        report - (dict) game ids that are duplicated or only have one side
+    -----------------------------------------
+    '''
+    venue = matches["venue"].to_numpy()
+    dated = matches["game_id"].notna().to_numpy()
+    ids = matches["game_id"].astype(str).to_numpy()
+    home_rows = np.flatnonzero((venue == "Home") & dated)
+    away_rows = np.flatnonzero((venue == "Away") & dated)
+
+    home_ids = pd.Index(ids[home_rows])
+    away_ids = pd.Index(ids[away_rows])
+    duplicated = sorted(set(home_ids[home_ids.duplicated()]) | set(away_ids[away_ids.duplicated()]))
+
+    #keep the first of any duplicates so the join stays one to one
+    home_keep = ~home_ids.duplicated()
+    away_keep = ~away_ids.duplicated()
+    home_rows, home_ids = home_rows[home_keep], home_ids[home_keep]
+    away_rows, away_ids = away_rows[away_keep], away_ids[away_keep]
+
+    match = away_ids.get_indexer(home_ids)
+    paired = match >= 0
+    report = {
+        "duplicated": duplicated,
+        "home_only": list(home_ids[~paired]),
+        "away_only": list(away_ids[~away_ids.isin(home_ids)]),
+    }
+    return home_rows[paired], away_rows[match[paired]], report
+
+def validate_games(matches):
+    '''
+    -----------------------------------------
+    Checks every game has exactly one home and one away row
+    Use: report = validate_games(matches)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) match data, game ids are computed if it has none
+    Returns:
+        report - (dict) duplicated, home_only and away_only game ids, all empty when valid
+    -----------------------------------------
+    '''
+    if "game_id" not in matches.columns:
+        matches = matches.assign(game_id=game_ids(matches))
+    return pair_games(matches)[2]
+
+def report_summary(report):
+    '''
+    -----------------------------------------
+    One line summary of a pairing report, None if nothing is wrong
+    Use: summary = report_summary(report)
+    -----------------------------------------
+    '''
+    if not any(report.values()):
+        return None
+    parts = [f"{len(ids)} {name.replace('_', ' ')}" for name, ids in report.items() if ids]
+    examples = [ids[0] for ids in report.values() if ids][:3]
+    return f"Unpaired games: {', '.join(parts)} (e.g. {', '.join(examples)})"
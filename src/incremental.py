@@ -0,0 +1,143 @@
+import pandas as pd
+import xgboost as xgb
+from datetime import datetime
+
+from model_registry import MODEL_DIR, data_fingerprint, load_metadata, load_model, save_model
+
+#trees added per incremental update, fit on the newly completed games only
+INCREMENTAL_ROUNDS = 10
+#incremental updates allowed between full refits
+REFIT_EVERY = 7
+#full refit accuracy lead (over recent games) that halves the incremental updates allowed
+DRIFT_TOLERANCE = 0.02
+DRIFT_DAYS = 14
+
+def continue_boosting(model, booster, x_new, y_new):
+    '''
+    -----------------------------------------
+    Adds INCREMENTAL_ROUNDS trees to an existing booster using only new games
+    Use: model = continue_boosting(model, booster, x_new, y_new)
+    -----------------------------------------
+    Parameters:
+        model - (XGBClassifier) model whose parameters to use
+        booster - (Booster) trained booster to continue from
+        x_new - (dataframe) features of newly completed games
+        y_new - (series) their results
+    Returns:
+        model - (XGBClassifier) updated model
+    -----------------------------------------
+    '''
+    #native training, the sklearn wrapper rejects a night where every game went one way
+    booster = xgb.train(model.get_xgb_params(), xgb.DMatrix(x_new, label=y_new),
+                        num_boost_round=INCREMENTAL_ROUNDS, xgb_model=booster)
+    continued = type(model)(**model.get_params())
+    continued.load_model(bytearray(booster.save_raw("json")))
+    return continued
+
+def drift_check(model, x, y, dates, days=DRIFT_DAYS):
+    '''
+    -----------------------------------------
+    Replays the last days of games one game day at a time with both policies,
+    full refit on everything before the day vs incremental updates from a
+    model trained before the window, scoring each day out of sample
+    Use: drift = drift_check(model, x, y, dates)
+    -----------------------------------------
+    Parameters:
+        model - (XGBClassifier) untrained model with the wanted parameters
+        x - (dataframe) training features
+        y - (series) training target
+        dates - (series) game dates aligned with x
+        days - (int) length of the replay window
+    Returns:
+        drift - (dict) games, full_accuracy, incremental_accuracy
+    -----------------------------------------
+    '''
+    start = dates.max() - pd.Timedelta(days=days)
+    game_days = sorted(dates[dates > start].unique())
+    if not game_days:
+        return {"games": 0, "full_accuracy": None, "incremental_accuracy": None}
+
+    before = (dates <= start).to_numpy()
+    incremental = type(model)(**model.get_params()).fit(x[before], y[before])
+    full_correct = incremental_correct = games = 0
+    for day in game_days:
+        seen = (dates < day).to_numpy()
+        today = (dates == day).to_numpy()
+        full = type(model)(**model.get_params()).fit(x[seen], y[seen])
+        full_correct += int((full.predict(x[today]) == y[today]).sum())
+        incremental_correct += int((incremental.predict(x[today]) == y[today]).sum())
+        games += int(today.sum())
+        incremental = continue_boosting(model, incremental.get_booster(), x[today], y[today])
+    return {
+        "games": games,
+        "full_accuracy": full_correct / games,
+        "incremental_accuracy": incremental_correct / games,
+    }
+
+def update_model(name, model, x_train, y_train, dates, directory=MODEL_DIR):
+    '''
+    -----------------------------------------
+    Brings the saved model up to date with the training data: reuses it if
+    unchanged, continues boosting on newly completed games if the saved model
+    was trained on a prefix of the data, and falls back to a full refit every
+    refit_every updates or when older rows changed; each periodic refit runs
+    the drift check and halves refit_every while incremental updates trail
+    a full refit (restoring REFIT_EVERY once they keep up)
+    Use: model = update_model(name, model, x_train, y_train, dates)
+    -----------------------------------------
+    Parameters:
+        name - (string) registry name
+        model - (XGBClassifier) untrained model with the wanted parameters
+        x_train - (dataframe) training features
+        y_train - (series) training target
+        dates - (series) game dates aligned with x_train
+        directory - (string) registry folder
+    Returns:
+        model - (XGBClassifier) trained model
+    -----------------------------------------
+    '''
+    params = model.get_params()
+    fingerprint = data_fingerprint(x_train, y_train, params)
+    meta = load_metadata(name, directory)
+    if meta is not None and meta["predictors"] == list(x_train.columns):
+        if meta["fingerprint"] == fingerprint:
+            return load_model(name, model, directory)
+
+        if "last_date" in meta:
+            old = (dates <= pd.Timestamp(meta["last_date"])).to_numpy()
+            prefix_matches = data_fingerprint(x_train[old], y_train[old], params) == meta["fingerprint"]
+            updates = meta.get("incremental_updates", 0)
+            if prefix_matches and updates < meta.get("refit_every", REFIT_EVERY) and (~old).any():
+                saved = load_model(name, model, directory)
+
+                #score the new games before learning them, tracking out of sample accuracy
+                correct = int((saved.predict(x_train[~old]) == y_train[~old]).sum())
+                updated = continue_boosting(model, saved.get_booster(), x_train[~old], y_train[~old])
+                save_model(name, updated, x_train.columns, fingerprint, directory,
+                           last_date=str(dates.max().date()),
+                           incremental_updates=updates + 1,
+                           full_refit_at=meta.get("full_refit_at"),
+                           refit_every=meta.get("refit_every", REFIT_EVERY),
+                           drift=meta.get("drift"),
+                           incremental_correct=meta.get("incremental_correct", 0) + correct,
+                           incremental_games=meta.get("incremental_games", 0) + int((~old).sum()))
+                return updated
+
+    #full refit, checking whether incremental updates are keeping up
+    drift = None
+    refit_every = meta.get("refit_every", REFIT_EVERY) if meta is not None else REFIT_EVERY
+    if meta is not None and meta.get("incremental_updates", 0) > 0:
+        drift = drift_check(model, x_train, y_train, dates)
+        if drift["games"] and drift["full_accuracy"] - drift["incremental_accuracy"] > DRIFT_TOLERANCE:
+            refit_every = max(1, refit_every // 2)
+        else:
+            refit_every = REFIT_EVERY
+
+    model.fit(x_train, y_train)
+    save_model(name, model, x_train.columns, fingerprint, directory,
+               last_date=str(dates.max().date()),
+               incremental_updates=0,
+               full_refit_at=datetime.now().isoformat(timespec="seconds"),
+               refit_every=refit_every,
+               drift=drift)
+    return model
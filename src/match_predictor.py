@@ -1,8 +1,32 @@
+import numpy as np
 import pandas as pd
-from xgboost import XGBClassifier
 from datetime import datetime
-from sklearn.metrics import accuracy_score, precision_score
-from sklearn.model_selection import train_test_split
+
+from store import load_matches
+from features import rolling_features, ROLLING_COLS
+from games import pair_games
+from standings import team_stats
+from model_registry import fit_or_load, load_tuned_config
+from metrics import stage, write_prometheus
+from team_state import load_team_states
+from compiled import INFERENCE_BACKEND, CompiledModel, pick_winners
+
+#columns run_predictions reads from the match store
+MATCH_COLUMNS = [
+    "date","venue","team","opponent","season","result","ot",
+    "gf","ga","sog_for","sog_against","pim_for","pim_against","game_id","team_id"
+]
+
+#only values known before a game starts, so games are scored on the same features
+#they were trained on; a game's own shots, penalties and overtime enter through
+#the rolling averages of later games
+PREDICTORS = [
+    "venue_code","opp_code","day_code",
+    "gf_rolling_home","ga_rolling_home","sog_for_rolling_home","sog_against_rolling_home",
+    "pim_for_rolling_home","pim_against_rolling_home",
+    "gf_rolling_away","ga_rolling_away","sog_for_rolling_away","sog_against_rolling_away",
+    "pim_for_rolling_away","pim_against_rolling_away"
+]
 
 def rolling_averages(group, cols, new_cols):
     '''
@@ -25,10 +49,11 @@ def rolling_averages(group, cols, new_cols):
     group = group[~((group["date"] < today) & group[new_cols].isna().any(axis=1))]
     return group
 
-def make_predictions_prob (model, data, predictors, threshold):
+def make_predictions_prob (model, data, predictors, threshold, name="predict", incremental=False, states=None):
     '''
     -----------------------------------------
-    Makes game predictions based on given predictors
+    Makes game predictions based on given predictors, reusing the saved model when the training data is unchanged,
+    scored by xgboost or the compiled model (INFERENCE_BACKEND=compiled)
     Use: combined = make_predictions_prob (model, data, predictors, threshold)
     -----------------------------------------
     Parameters: 
@@ -36,180 +61,235 @@ def make_predictions_prob (model, data, predictors, threshold):
         data - (dataframe) matchup to run predictions on
         predictors - (array) list of columns we want to use in predictions
         threshold - (float) classification threshold (typically 0.5 for balanced classes)
+        name - (string) model registry name
+        incremental - (bool) continue boosting the saved model on new games instead of refitting
+        states - (TeamStateIndex) per-team rolling states, future games then get each team's
+                 state as of the game's date instead of averages over unplayed games
     Returns: 
         combined - (dataframe) calculated predictions for each matchup
     -----------------------------------------
     '''
     today = pd.Timestamp.today().normalize()
     train = data[data["date"]<today]
-    future_games = data[data["date"]>= today].copy()
-    future_games[predictors] = future_games[predictors].fillna(0)
+    #a new frame with missing rolling averages (teams without earlier games) filled, the predictions are added to it
+    combined = data[data["date"]>= today].fillna({col: 0 for col in predictors})
 
-    if (future_games.empty):
+    if (combined.empty):
         print("No future games found")
-        return pd.DataFrame()
+        #keeps the matchup columns so callers can still sort and filter it
+        return combined.assign(prediction=0, home_win_probability=0.0, away_win_probability=0.0, predicted_winner="")
+
+    if states is not None:
+        for side in ["home", "away"]:
+            state = states.lookup(combined[f"{side}_team"], combined["date"])
+            combined[[f"{col}_rolling_{side}" for col in states.cols]] = np.nan_to_num(state)
     
     x_train = train[predictors]
     y_train = train["target"]
 
-    model.fit(x_train, y_train)
-    x_future = future_games[predictors]
-    probs = model.predict_proba(x_future)[:, 1]
+    with stage("fit", rows=len(x_train)):
+        if incremental:
+            from incremental import update_model
+            model = update_model(name, model, x_train, y_train, train["date"])
+        else:
+            model = fit_or_load(name, model, x_train, y_train)
+    x_future = combined[predictors]
+    with stage("predict", rows=len(x_future), backend=INFERENCE_BACKEND):
+        if INFERENCE_BACKEND == "compiled":
+            probs = CompiledModel.load(name).predict_proba(x_future.to_numpy(dtype=np.float32))
+        else:
+            probs = model.predict_proba(x_future)[:, 1]
     preds = (probs > threshold).astype(int)
-    combined = future_games.copy()
     combined["prediction"] = preds
     combined["home_win_probability"] = probs
     combined["away_win_probability"] = 1-probs
-    combined["predicted_winner"] = combined.apply(lambda row: row["home_team"] if row["home_win_probability"] >= 0.5 else row["away_team"],axis=1)
+    combined["predicted_winner"] = pick_winners(probs, combined["home_team"], combined["away_team"])
     return combined
 
 def build_matchups(matches):
     '''
     -----------------------------------------
-    Merges matchups so there is only one game per predicted per matchup
-    Use: merged = build_matchups(matches)
+    Builds one row per game by pairing each home row with its away row on the
+    game id and gathering both sides' columns by row position, keeping only
+    the columns predictions need; games missing a side or listed twice are
+    left out and returned in the pairing report rather than turned into half
+    empty rows (ingest reports them, see check_games)
+    Use: merged, report = build_matchups(matches)
     -----------------------------------------
     Parameters: 
-        matches - (dataframe) contains all match data
+        matches - (dataframe) contains all match data, with game ids and rolling averages
     Returns: 
-        merged - (dataframe) updated match data
+        merged - (dataframe) one row per game with ids, target and predictor columns,
+                 teams and season as categories, small ints and float32 stats
+        report - (dict) duplicated, home_only and away_only game ids
     -----------------------------------------
     '''
-    home_games = matches[matches["venue"] == "Home"].copy()
-    away_games = matches[matches["venue"] == "Away"].copy()
-
-    # Merge home rows with the corresponding away rows (same date + same opponent/team swap)
-    merged = pd.merge(
-        home_games, away_games,
-        left_on=["date", "opponent"],
-        right_on=["date", "team"],
-        suffixes=("_home", "_away"),
-        how="outer"
-    )
+    home, away, report = pair_games(matches)
+
+    def side(col, rows):
+        values = matches[col]
+        #categories are gathered by code so they stay categories
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return pd.Categorical.from_codes(values.cat.codes.to_numpy()[rows], dtype=values.dtype)
+        return values.to_numpy()[rows]
+
+    date = pd.DatetimeIndex(side("date", home))
+    result_home = side("result", home)
+
+    merged = {
+        "game_id": side("game_id", home),
+        "date": date,
+        "season": side("season", home),
+        "home_team": side("team", home),
+        "away_team": side("team", away),
+        "result_home": result_home,
+        # Target: did the home team win?
+        "target": (result_home == "W").astype(np.int8),
+        # Fixed team registry ids, the same for a team across data refreshes
+        "venue_code": side("team_id", home),
+        "opp_code": side("team_id", away),
+        "day_code": date.dayofweek.astype(np.int8),
+    }
+    for col in [c for c in matches.columns if "_rolling" in c or "_ewm_" in c]:
+        merged[f"{col}_home"] = side(col, home)
+        merged[f"{col}_away"] = side(col, away)
+
+    merged = pd.DataFrame(merged)
+    return merged.sort_values(["date", "game_id"], kind="stable", ignore_index=True), report
 
-    merged = merged.rename(columns={
-        "team_home": "home_team",
-        "team_away": "away_team",
-        "opponent_away": "away_opponent",
-        "opponent_home": "home_opponent"
+def calculate_team_stats(games):
+    '''
+    -----------------------------------------
+    Calculates team stats like total wins and losses, win average, shots, etc.
+    Use: stats = calculate_team_stats(games)
+    -----------------------------------------
+    Parameters: 
+        games - (dataframe) has past game information (to ensure all stats aren't null)
+    Returns: 
+        stats - (dataframe) numeric stats per team, sorted by win rate
+    -----------------------------------------
+    '''
+    stats = team_stats(games)
+
+    #print stats per team sorted by win rate
+    table = pd.DataFrame({
+        "team": stats["team"],
+        "win rate": stats["win_rate"],
+        "win/loss ratio": stats["wins"].astype(str) + ":" + stats["losses"].astype(str),
+        "avg shots": stats["avg_shots"],
+        "shooting accuracy": stats["shooting_accuracy"],
+        "avg penalty min": stats["avg_pim"],
     })
+    print(table.to_string(index=False, float_format="%.3f"))
+    return stats
 
-    # Sanity check: home_opponent should equal away_team
-    #assert all(merged["home_opponent"] == merged["away_team"])
-    merged["venue"] = merged["home_team"]
-    merged["season"] = merged["season_home"]
-    merged = merged.drop(columns=["venue_home", "venue_away", "season_home", "season_away"])
+DEFAULT_PARAMS = {"n_estimators": 100, "learning_rate": 0.1, "max_depth": 4}
+DEFAULT_THRESHOLD = 0.6
+DEFAULT_HIGH_CONF_THRESHOLD = 0.7
 
-    # Target: did the home team win?
-    merged["target"] = (merged["result_home"] == "W").astype(int)
-
-    # Create matchup-level features (home − away)
-    merged["gf_diff"] = merged["gf_home"] - merged["gf_away"]
-    merged["ga_diff"] = merged["ga_home"] - merged["ga_away"]
-    merged["shot_diff"] = merged["sog_for_home"] - merged["sog_for_away"]
-    merged["pim_diff"] = merged["pim_for_home"] - merged["pim_for_away"]
-    merged["ppo_diff"] = merged["ppo_for_home"] - merged["ppo_for_away"]
-    merged["ppg_diff"] = merged["ppg_for_home"] - merged["ppg_for_away"]
+def make_model():
+    '''
+    -----------------------------------------
+    Creates the prediction model with its hyperparameters, using the tuned
+    ones recorded by tuning.py when there are any
+    Use: model = make_model()
+    -----------------------------------------
+    '''
+    #imported here so loading and feature building (e.g. the app's read-only views) don't pay for xgboost
+    from xgboost import XGBClassifier
 
-    # Encode categorical vars
-    merged["venue_code"] = merged["venue"].astype("category").cat.codes
-    merged["opp_code"] = merged["away_team"].astype("category").cat.codes
-    merged["day_code"] = merged["date"].dt.dayofweek
-    merged["overtime"] = merged["ot_home"].isin(["OT", "SO"]).astype(int)
+    params = dict(DEFAULT_PARAMS, **load_tuned_config().get("params", {}))
+    return XGBClassifier(**params)
 
-    return merged
+def load_match_history():
+    '''
+    -----------------------------------------
+    Loads the match columns used for predictions, team names and ids were
+    normalized by the team registry when the games were stored
+    Use: matches = load_match_history()
+    -----------------------------------------
+    Parameters:
+        None
+    Returns:
+        matches - (dataframe) match data
+    -----------------------------------------
+    '''
+    with stage("load") as info:
+        matches = load_matches(columns=MATCH_COLUMNS)
+        info["rows"] = len(matches)
+    return matches
 
-def calculate_team_stats(games):
+def build_features(matches):
     '''
     -----------------------------------------
-    Calculates team stats like total wins and losses, win average, shots, etc.
-    Use: calculate_team_stats(games)
+    Adds rolling averages and builds one row per matchup with the predictor columns
+    Use: matchups = build_features(matches)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) match data from load_match_history
+    Returns:
+        matchups - (dataframe) matchup data
     -----------------------------------------
-    Parameters: 
-        games - (dataframe) has past game information (to ensure all stats aren't null)
-    Returns: 
-        df - (dataframe) has stats and information from current season games
-    -----------------------------------------
-    '''
-    #calculate stats per team
-    teams = games.groupby('team')
-    win_percent = []
-    for team_name, team_games in teams:
-        wins = team_games[team_games['result'] == 'W']
-        losses = team_games[team_games['result']=='L']
-        win_avg = f"{len(wins) / len(team_games) if len(team_games) > 0 else 0:.3f}"
-        ratio = f"{len(wins)}:{len(losses)}"
-        shots = team_games['sog_for'].sum()
-        shots_avg = f"{shots/len(team_games)if len(team_games) > 0 else 0:.3f}"
-        goals = team_games['gf'].sum()
-        shooting_acc = f"{goals/shots if shots >0 else 0:0.3f}"
-        pim = team_games['pim_for'].sum()
-        avg_pim = f"{pim/len(team_games) if len(team_games) > 0 else 0:.3f}"
-        team_win = [team_name, win_avg, ratio, shots_avg, shooting_acc, avg_pim]
-        win_percent.append(team_win)
-
-    #create and print stats per team dataframe sorted by probability
-    column_names = ['team', 'win rate', 'win/loss ratio', 'avg shots', 'shooting accuracy', 'avg penalty min']
-    win_prob = pd.DataFrame(win_percent, columns=column_names)
-    win_prob = win_prob.sort_values(by="win rate", ascending=False)
-    print(win_prob.to_string(index=False))
-
-def run_predictions():
+    '''
+    with stage("rolling", rows=len(matches)):
+        matches_rolling = rolling_features(matches, ROLLING_COLS)
+    with stage("matchups", rows=len(matches_rolling)) as info:
+        matchups, report = build_matchups(matches_rolling)
+        info["unpaired"] = sum(len(ids) for ids in report.values())
+    return matchups
+
+def run_predictions(matches=None, matchups=None, incremental=True, states=None):
     '''
     -----------------------------------------
     Generate predictions for upcoming games
-    Use: eval_df, prob_pf = run_predictions()
+    Use: eval_df, prob_pf, high_conf = run_predictions()
     -----------------------------------------
     Parameters: 
-        None
+        matches - (dataframe) match data, loaded from the store if not given
+        matchups - (dataframe) output of build_features(matches), built if not given
+        incremental - (bool) update the saved model with new games instead of a full refit
+        states - (TeamStateIndex) per-team rolling states, loaded from the team state file if not given
     Returns: 
         eval_df - (dataframe) contains past predictions to show accuracy of model
         prob_pf - (dataframe) contains predictions for upcoming games
         high_conf - (dataframe) contains the higher probability predictions, sorted by probability
     -----------------------------------------
     '''
-    matches = pd.read_csv("matches.csv", index_col=0)
-    matches["date"] = pd.to_datetime(matches["date"]).dt.normalize()
+    #imported here so loading and feature building don't pay for scikit-learn
+    from sklearn.metrics import accuracy_score, precision_score
+    from sklearn.model_selection import train_test_split
 
-    today = datetime.today()
-
-    matches["team"] = matches["team"].replace({
-     "Utah Hockey Club": "Utah Mammoth"
-    })
-    matches["opponent"] = matches["opponent"].replace({
-        "Utah Hockey Club": "Utah Mammoth"
-    })
+    if matches is None:
+        matches = load_match_history()
 
-    past_games = matches[matches["date"] < today].copy()
-    calculate_team_stats(past_games)
+    today = datetime.today()
 
-    cols = ["gf","ga","sog_for","sog_against","pim_for","pim_against"]
-    new_cols = [f"{c}_rolling" for c in cols]
+    past_games = matches[matches["date"] < today]
+    with stage("team_stats", rows=len(past_games)):
+        calculate_team_stats(past_games)
 
-    matches_rolling = matches.groupby("team", group_keys=False).apply(lambda x: rolling_averages(x,cols,new_cols))
-    matches_rolling.index = range(matches_rolling.shape[0])
+    if matchups is None:
+        matchups = build_features(matches)
 
-    matchups = build_matchups(matches_rolling)
+    predictors = PREDICTORS
 
-    predictors = [
-        "venue_code","opp_code","day_code","shot_diff","pim_diff","ppo_diff","ppg_diff","overtime",
-        "gf_rolling_home","ga_rolling_home","sog_for_rolling_home","sog_against_rolling_home",
-        "pim_for_rolling_home","pim_against_rolling_home",
-        "gf_rolling_away","ga_rolling_away","sog_for_rolling_away","sog_against_rolling_away",
-        "pim_for_rolling_away","pim_against_rolling_away"
-    ]
+    model = make_model()
+    config = load_tuned_config()
+    threshold = config.get("threshold", DEFAULT_THRESHOLD)
+    high_conf_threshold = config.get("high_conf_threshold", DEFAULT_HIGH_CONF_THRESHOLD)
 
-    model = XGBClassifier(n_estimators=100, learning_rate=0.1, max_depth=4)
+    if states is None:
+        states = load_team_states(ROLLING_COLS)
 
     #include probabilities into results
-    prob_pred_df = make_predictions_prob(model, matchups, predictors, threshold=0.6)
+    prob_pred_df = make_predictions_prob(model, matchups, predictors, threshold=threshold, incremental=incremental, states=states)
     prob_pred_df = prob_pred_df.sort_values(by="date", ascending=True)
     print("----- Probability Predictions -----")
     print(prob_pred_df[["date", "home_team","away_team", "home_win_probability", "away_win_probability","predicted_winner"]])
     prob_pred_df.to_csv("predictions.csv", index=False)
 
     #get the highest probability games
-    high_conf = prob_pred_df[prob_pred_df["home_win_probability"] > 0.7].sort_values(by="home_win_probability", ascending=False)
+    high_conf = prob_pred_df[prob_pred_df["home_win_probability"] > high_conf_threshold].sort_values(by="home_win_probability", ascending=False)
     if (not high_conf.empty):
         high_conf.to_csv("high_confidence_predictions.csv", index=False)
         #print(high_conf[["date", "prediction", "home_win_probability", "away_win_probability","predicted_winner"]].head())
@@ -218,25 +298,31 @@ def run_predictions():
         print("----- Top 10 Highest Predictions -----")
         print(top10[["date","home_team", "away_team" ,"prediction", "home_win_probability", "away_win_probability","predicted_winner"]])
 
-    past_matchups = matchups[matchups["date"] < today].copy()
+    past_matchups = matchups[matchups["date"] < today]
     X = past_matchups[predictors]
     y = past_matchups["target"]
     X_train, X_test, y_train, y_test = train_test_split(X, y, shuffle=False, test_size=0.2)
 
-    model.fit(X_train, y_train)
-    preds = model.predict(X_test)
-    probs = model.predict_proba(X_test)[:, 1]
-
-    print(f"Accuracy: {accuracy_score(y_test, preds):.2f}")
-    print(f"Precision: {precision_score(y_test, preds):.2f}")
-
-    eval_df = past_matchups.iloc[y_test.index].copy()
-    eval_df["predicted"] = preds
-    eval_df["probability"] = probs
-    eval_df["correct"] = (eval_df["predicted"] == eval_df["target"]).astype(int)
-    eval_df["correct_label"] = eval_df["correct"].map({1: "Correct", 0: "Incorrect"})
+    with stage("evaluate", rows=len(X_test)) as info:
+        model = fit_or_load("evaluate", model, X_train, y_train)
+        preds = model.predict(X_test)
+        probs = model.predict_proba(X_test)[:, 1]
+        info["accuracy"] = accuracy_score(y_test, preds)
+        info["precision"] = precision_score(y_test, preds)
+
+    print(f"Accuracy: {info['accuracy']:.2f}")
+    print(f"Precision: {info['precision']:.2f}")
+
+    correct = (preds == y_test.to_numpy()).astype(int)
+    eval_df = past_matchups.iloc[y_test.index].assign(
+        predicted=preds,
+        probability=probs,
+        correct=correct,
+        correct_label=np.where(correct == 1, "Correct", "Incorrect"),
+    )
 
     print("----- Evaluation Predictions -----")
     print(eval_df[["date", "home_team", "away_team", "predicted", "probability", "target", "correct_label"]])
 
+    write_prometheus()
     return eval_df, prob_pred_df, high_conf
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    #not available on windows, stages then report no process peak
+    resource = None
+
+#prometheus text file, e.g. for node_exporter's textfile collector
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics.prom")
+#structured logs are json lines on the nhl_predictor logger, also appended here if set
+METRICS_LOG = os.environ.get("METRICS_LOG")
+#trace python allocations for per stage peaks (slower), otherwise only the process peak rss is recorded
+TRACE_MEMORY = os.environ.get("METRICS_TRACEMALLOC") == "1"
+
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+logger = logging.getLogger("nhl_predictor")
+if METRICS_LOG:
+    handler = logging.FileHandler(METRICS_LOG)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_help = {
+    "nhl_requests_total": ("counter", "Page requests by cache status and http status"),
+    "nhl_request_bytes_total": ("counter", "Page bytes by cache status"),
+    "nhl_request_retries_total": ("counter", "Request retries after 429/5xx or connection errors"),
+    "nhl_request_seconds": ("histogram", "Page request latency including cache lookups and retries"),
+    "nhl_stage_runs_total": ("counter", "Pipeline stage runs"),
+    "nhl_stage_seconds_total": ("counter", "Total seconds spent per pipeline stage"),
+    "nhl_stage_last_seconds": ("gauge", "Duration of the last run of each pipeline stage"),
+    "nhl_stage_peak_memory_bytes": ("gauge", "Peak traced python allocations during the last run of each pipeline stage (METRICS_TRACEMALLOC=1)"),
+    "nhl_process_peak_rss_bytes": ("gauge", "Peak resident memory of the process so far, sampled as each pipeline stage ends"),
+}
+
+#most recent events for the app panel
+recent_requests = deque(maxlen=1000)
+last_stages = {}
+
+#peaks carried by this thread's open traced stages, innermost last: a nested stage
+#resets the tracemalloc peak, so the peak reached before it is kept here for its
+#parents (per thread, the app runs read_stats on a background thread)
+_local = threading.local()
+
+def stage_peaks():
+    if not hasattr(_local, "stage_peaks"):
+        _local.stage_peaks = []
+    return _local.stage_peaks
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc(name, value=1, **labels):
+    with _lock:
+        key = (name, label_key(labels))
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, label_key(labels))] = value
+
+def observe(name, value, buckets=REQUEST_BUCKETS, **labels):
+    with _lock:
+        key = (name, label_key(labels))
+        if key not in _histograms:
+            _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        histogram = _histograms[key]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["counts"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+def log_event(event, **fields):
+    '''
+    -----------------------------------------
+    Emits one structured (json) log line
+    Use: log_event("request", url=url, seconds=0.2)
+    -----------------------------------------
+    '''
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(event=event, time=round(time.time(), 3), **fields), default=str))
+
+def record_request(url, cache, seconds, size, retries=0, status=None):
+    '''
+    -----------------------------------------
+    Records one page request
+    Use: record_request(url, "miss", seconds, size, retries, status)
+    -----------------------------------------
+    Parameters:
+        url - (string) page url
+        cache - (string) hit, revalidated, miss, uncached or error
+        seconds - (float) time to get the page, including retries
+        size - (int) page bytes
+        retries - (int) retried attempts
+        status - (int) final http status, None when served from the cache
+    -----------------------------------------
+    '''
+    inc("nhl_requests_total", cache=cache, status=status or "")
+    inc("nhl_request_bytes_total", size, cache=cache)
+    if retries:
+        inc("nhl_request_retries_total", retries)
+    observe("nhl_request_seconds", seconds, cache=cache)
+    event = {"url": url, "cache": cache, "status": status, "seconds": round(seconds, 4), "bytes": size, "retries": retries}
+    recent_requests.append(event)
+    log_event("request", **event)
+
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macos
+    return peak if sys.platform == "darwin" else peak * 1024
+
+@contextmanager
+def stage(name, **fields):
+    '''
+    -----------------------------------------
+    Times a pipeline stage and records the process peak rss, plus the
+    stage's own peak python allocations when METRICS_TRACEMALLOC=1
+    Use: with stage("fit"): model.fit(x, y)
+    -----------------------------------------
+    Parameters:
+        name - (string) stage name, e.g. load, rolling, matchups, fit, predict, evaluate
+        fields - extra values for the structured log line, e.g. rows
+    -----------------------------------------
+    '''
+    peaks = stage_peaks()
+    tracing = TRACE_MEMORY and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    elif TRACE_MEMORY:
+        if peaks:
+            peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    if TRACE_MEMORY:
+        peaks.append(0)
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        seconds = time.perf_counter() - start
+        peak = None
+        if TRACE_MEMORY:
+            peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            if tracing:
+                tracemalloc.stop()
+        process_peak = peak_rss()
+        inc("nhl_stage_runs_total", stage=name)
+        inc("nhl_stage_seconds_total", seconds, stage=name)
+        set_gauge("nhl_stage_last_seconds", seconds, stage=name)
+        if peak is not None:
+            set_gauge("nhl_stage_peak_memory_bytes", peak, stage=name)
+        if process_peak is not None:
+            set_gauge("nhl_process_peak_rss_bytes", process_peak)
+        event = dict(fields, stage=name, seconds=round(seconds, 4), peak_memory_bytes=peak, process_peak_rss_bytes=process_peak)
+        last_stages[name] = dict(event, finished=time.time())
+        log_event("stage", **event)
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+def prometheus_text():
+    '''
+    -----------------------------------------
+    Renders every metric in the prometheus text exposition format
+    Use: text = prometheus_text()
+    -----------------------------------------
+    '''
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {key: dict(value, counts=list(value["counts"])) for key, value in _histograms.items()}
+
+    lines = []
+    for name, (kind, description) in _help.items():
+        series = {**counters, **gauges} if kind != "histogram" else histograms
+        keys = sorted(key for key in series if key[0] == name)
+        if not keys:
+            continue
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in keys:
+            labels = key[1]
+            if kind == "histogram":
+                histogram = series[key]
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram['count']}")
+            else:
+                lines.append(f"{name}{format_labels(labels)} {series[key]}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path=METRICS_FILE):
+    '''
+    -----------------------------------------
+    Writes the metrics text file, swapped in whole so scrapers never read half of it
+    Use: write_prometheus()
+    -----------------------------------------
+    '''
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+def request_summary():
+    '''
+    -----------------------------------------
+    Summarizes the recent requests per cache status
+    Use: summary = request_summary()
+    -----------------------------------------
+    Returns:
+        summary - (list) dicts with cache, requests, mean/max seconds, bytes, retries
+    -----------------------------------------
+    '''
+    rows = {}
+    for event in list(recent_requests):
+        row = rows.setdefault(event["cache"], {"cache": event["cache"], "requests": 0, "seconds": 0.0,
+                                               "max_seconds": 0.0, "bytes": 0, "retries": 0})
+        row["requests"] += 1
+        row["seconds"] += event["seconds"]
+        row["max_seconds"] = max(row["max_seconds"], event["seconds"])
+        row["bytes"] += event["bytes"]
+        row["retries"] += event["retries"]
+    for row in rows.values():
+        row["mean_seconds"] = row.pop("seconds") / row["requests"]
+    return list(rows.values())
+
+def stage_summary():
+    '''
+    -----------------------------------------
+    The last run of every stage, in the order they finished
+    Use: summary = stage_summary()
+    -----------------------------------------
+    '''
+    return sorted(last_stages.values(), key=lambda event: event["finished"])
@@ -0,0 +1,151 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+MODEL_DIR = "models"
+TUNED_CONFIG = "best_params.json"
+
+def data_fingerprint(x, y, params=None):
+    '''
+    -----------------------------------------
+    Fingerprints training data (and model parameters) so a saved model is
+    only reused when it was trained on exactly the same thing
+    Use: fingerprint = data_fingerprint(x, y, params)
+    -----------------------------------------
+    Parameters:
+        x - (dataframe) training features
+        y - (series) training target
+        params - (dict) model parameters
+    Returns:
+        fingerprint - (string) sha256 hex digest
+    -----------------------------------------
+    '''
+    digest = hashlib.sha256()
+    digest.update(json.dumps(list(x.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(x, index=False).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def model_paths(name, directory=MODEL_DIR):
+    return os.path.join(directory, f"{name}.json"), os.path.join(directory, f"{name}.meta.json")
+
+def save_model(name, model, predictors, fingerprint, directory=MODEL_DIR, **extra):
+    '''
+    -----------------------------------------
+    Saves a trained booster with its feature schema and data fingerprint
+    Use: save_model(name, model, predictors, fingerprint)
+    -----------------------------------------
+    Parameters:
+        name - (string) registry name, e.g. predict
+        model - (XGBClassifier) trained model
+        predictors - (array) feature columns in training order
+        fingerprint - (string) training data fingerprint
+        directory - (string) registry folder
+        extra - extra metadata to store, e.g. incremental training state
+    Returns:
+        None
+    -----------------------------------------
+    '''
+    os.makedirs(directory, exist_ok=True)
+    model_path, meta_path = model_paths(name, directory)
+    model.save_model(model_path)
+    meta = {
+        "predictors": list(predictors),
+        "fingerprint": fingerprint,
+        "params": model.get_params(),
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        **extra,
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+
+def load_metadata(name, directory=MODEL_DIR):
+    '''
+    -----------------------------------------
+    Gets a saved model's metadata
+    Use: meta = load_metadata(name)
+    -----------------------------------------
+    Returns:
+        meta - (dict) predictors, fingerprint, params, trained_at; None if not saved
+    -----------------------------------------
+    '''
+    model_path, meta_path = model_paths(name, directory)
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+def load_model(name, model, directory=MODEL_DIR):
+    '''
+    -----------------------------------------
+    Loads a saved booster into a new estimator with model's parameters
+    Use: model = load_model(name, model)
+    -----------------------------------------
+    '''
+    #load into a new estimator, loading fills in params (e.g. base_score) on the instance
+    loaded = type(model)(**model.get_params())
+    loaded.load_model(model_paths(name, directory)[0])
+    return loaded
+
+def fit_or_load(name, model, x_train, y_train, directory=MODEL_DIR):
+    '''
+    -----------------------------------------
+    Loads the saved model if it was trained on the same data, otherwise
+    fits the model and saves it
+    Use: model = fit_or_load(name, model, x_train, y_train)
+    -----------------------------------------
+    Parameters:
+        name - (string) registry name
+        model - (XGBClassifier) untrained model with the wanted parameters
+        x_train - (dataframe) training features
+        y_train - (series) training target
+        directory - (string) registry folder
+    Returns:
+        model - (XGBClassifier) trained model
+    -----------------------------------------
+    '''
+    fingerprint = data_fingerprint(x_train, y_train, model.get_params())
+    meta = load_metadata(name, directory)
+    if meta is not None and meta["fingerprint"] == fingerprint and meta["predictors"] == list(x_train.columns):
+        return load_model(name, model, directory)
+
+    model.fit(x_train, y_train)
+    save_model(name, model, x_train.columns, fingerprint, directory)
+    return model
+
+def save_tuned_config(config, directory=MODEL_DIR):
+    '''
+    -----------------------------------------
+    Records the best tuning result for run_predictions to pick up
+    Use: save_tuned_config(config)
+    -----------------------------------------
+    Parameters:
+        config - (dict) params, threshold, high_conf_threshold and scores
+        directory - (string) registry folder
+    Returns:
+        None
+    -----------------------------------------
+    '''
+    os.makedirs(directory, exist_ok=True)
+    config = dict(config, tuned_at=datetime.now().isoformat(timespec="seconds"))
+    with open(os.path.join(directory, TUNED_CONFIG), "w") as f:
+        json.dump(config, f, indent=2, default=str)
+
+def load_tuned_config(directory=MODEL_DIR):
+    '''
+    -----------------------------------------
+    Gets the recorded tuning result
+    Use: config = load_tuned_config()
+    -----------------------------------------
+    Returns:
+        config - (dict) params and thresholds, empty if never tuned
+    -----------------------------------------
+    '''
+    path = os.path.join(directory, TUNED_CONFIG)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
@@ -1,139 +1,255 @@
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 from io import StringIO
-import time
 from datetime import datetime
-import os
 
-def past_stats():
+from store import load_matches, write_matches, normalize_matches
+from fetcher import fetch, get_fetcher, site_url
+from cache import CURRENT_TTL
+from games import validate_games, report_summary
+from teams import canonical_names, unknown_teams
+from standings import update_standings
+from team_state import update_team_states
+from metrics import stage, write_prometheus
+from tables import parse_page, page_links, schedule_table, gamelog_table
+
+#earliest season (by the year it ends) past_stats walks back to, backfill.py reaches further
+FIRST_SEASON = 2022
+
+def team_links(standings_url, ttl=None):
     '''
     -----------------------------------------
-    Get past season stats, from current season to 2021
-    Use: df = past_stats()
+    Gets team page links and names from a season standings page
+    Use: team_urls, team_names = team_links(standings_url, ttl)
     -----------------------------------------
-    Parameters: 
-        None
-    Returns: 
-        df - (dataframe) has stats and information from past games
+    Parameters:
+        standings_url - (string) league season standings url
+        ttl - (int) seconds a cached copy stays fresh, None for completed seasons
+    Returns:
+        team_urls - (list) full team page urls
+        team_names - (list) team names in the same order
+    Raises:
+        ValueError - the page does not have the two conference standings tables
     -----------------------------------------
     '''
-    current_year = datetime.now().year
-    if (datetime.now().month < 4):
-        current_year -= 1
-    #get data from url with standings
-    standings_url = f"https://www.hockey-reference.com/leagues/NHL_{current_year}.html"
-    data = requests.get(standings_url)
-    time.sleep(2)
+    data = fetch(standings_url, ttl)
 
     #get beginning table
-    soup = BeautifulSoup(data.text,features="lxml")
-    all_matches = []
+    soup = BeautifulSoup(data,features="lxml")
+    tables = soup.select('table', class_=['sortable','stats_table','now_sortable'])
+    if len(tables) < 2:
+        raise ValueError(f"No standings tables on {standings_url}")
     team_urls = []
     team_names = []
     for x in range(0,2,1):
-        starting_table = soup.select('table', class_=['sortable','stats_table','now_sortable'])[x]
-        
+        starting_table = tables[x]
+
         #get team links and team name from table
         links = starting_table.find_all('a')
         for link in links:
             href = link.get("href")
             if href and '/teams/' in href:
-                full_url = f"https://www.hockey-reference.com{href}"
+                full_url = site_url(href)
                 name = link.text.strip()  # Get visible text of link
                 team_urls.append(full_url)
                 team_names.append(name)
+    return team_urls, team_names
 
-    for x in range(0,len(team_urls),1): 
-        #get team url 
-        team_url = team_urls[x]
-        team_name = team_names[x]
-
-        data = requests.get(team_url)
-        time.sleep(2)
-
-        #get link from header
-        soup = BeautifulSoup(data.text,features="lxml")
-        header = soup.select('div[data-template="Partials/Teams/Summary"]')[0]
-        links = header.find_all('a')
-        links = [l.get("href") for l in links]
-        schedule_link = [l for l in links if '_games' in l]
-        schedule_link = [f"https://www.hockey-reference.com{schedule_link[0]}"][0]
-
-        #get link for game specific stats
-        soup_game = BeautifulSoup(data.text,features="lxml")
-        links = soup.find_all('a')
-        links = [l.get("href") for l in links]
-        links = [l for l in links if l and '_gamelog' in l]
-        gamelog_link = [f"https://www.hockey-reference.com{links[0]}"][0] 
-        
-        years = list(range(current_year,2021,-1))
-        for year in years:
-            data = requests.get(schedule_link)
-            time.sleep(2)
-            soup = BeautifulSoup(data.text,features="lxml")
-
-            #match dataframe
-            matches = pd.read_html(StringIO(data.text), match="Regular Season")[0]
-
-            #adjust cols
-            cols = matches.columns.tolist()
-            cols[cols.index("Unnamed: 6")] = 'Result'
-            cols[cols.index('Unnamed: 2')] = "Venue"
-            matches.columns = cols
-            matches = matches.drop(['Unnamed: 7','OL','Streak','Att.','LOG','Notes'], axis=1)
-
-            data = requests.get(gamelog_link)
-            soup_game = BeautifulSoup(data.text,features="lxml")
-            time.sleep(2)
-
-            #shooting dataframe
-            shooting = pd.read_html(StringIO(data.text), match= "Regular Season")[0]
-            if isinstance(shooting.columns, pd.MultiIndex):
-                shooting.columns = shooting.columns.droplevel()
-
-            #rename columns to make data clearer
-            cols = shooting.columns.tolist()
-            cols[cols.index('SOG')] = 'SOG_For'
-            cols[cols.index('PIM')] = 'PIM_For'
-            cols[cols.index('PPG')] = 'PPG_For'
-            cols[cols.index('PPO')] = 'PPO_For'
-            cols[cols.index('SOG')] = 'SOG_Against'
-            cols[cols.index('PIM')] = 'PIM_Against'
-            cols[cols.index('PPG')] = 'PPG_Against'
-            cols[cols.index('PPO')] = 'PPO_Against'
-            shooting.columns = cols
-
-            #combine dataframes together
-            try:
-                team_data = matches.merge(shooting[["Date", "SOG_For","SOG_Against","PIM_For","PIM_Against","OT","PPG_For","PPG_Against","PPO_For","PPO_Against"]], on = "Date")
-            except ValueError:
-                continue
-
-            #add season and team data
-            team_data["Season"]= f"{year-1}-{year}"
-            team_data["Team"] = team_name
-            team_data["Venue"] = team_data["Venue"].replace('@', 'Away')
-            team_data["Venue"] = team_data["Venue"].fillna('Home')
-
-            all_matches.append(team_data)
-            time.sleep(2)
-
-            print(f"Successfully read {team_name} {year-1}-{year} stats")
-
-            #get next schedule link
-            link = soup.select_one('a.button2.prev')
-            if link and link.has_attr('href'):
-                schedule_link = f"https://www.hockey-reference.com{link['href']}"
-            else:
-                break
-
-            #get next gamelog link
-            link = soup_game.select_one('a.button2.prev')
-            if link and link.has_attr('href'):
-                gamelog_link = f"https://www.hockey-reference.com{link['href']}"
-            else:
-                break 
+def legacy_schedule(schedule_html):
+    '''
+    -----------------------------------------
+    Reads the schedule table with read_html and positional column names, for
+    pages whose table has no data-stat attributes
+    Use: matches = legacy_schedule(schedule_html)
+    -----------------------------------------
+    '''
+    #match dataframe
+    matches = pd.read_html(StringIO(schedule_html), match="Regular Season")[0]
+
+    #adjust cols, the current season has an extra Time column
+    cols = matches.columns.tolist()
+    shift = 1 if "Time" in cols else 0
+    cols[cols.index(f"Unnamed: {6 + shift}")] = 'Result'
+    cols[cols.index(f"Unnamed: {2 + shift}")] = "Venue"
+    matches.columns = cols
+    matches = matches.drop([f"Unnamed: {7 + shift}",'OL','Streak','Att.','LOG','Notes'], axis=1, errors="ignore")
+    matches["Date"] = pd.to_datetime(matches["Date"], errors="coerce")
+    return matches
+
+def legacy_gamelog(gamelog_html):
+    '''
+    -----------------------------------------
+    Reads the game log table with read_html and positional column names, for
+    pages whose table has no data-stat attributes
+    Use: shooting = legacy_gamelog(gamelog_html)
+    -----------------------------------------
+    '''
+    #shooting dataframe
+    shooting = pd.read_html(StringIO(gamelog_html), match= "Regular Season")[0]
+    if isinstance(shooting.columns, pd.MultiIndex):
+        shooting.columns = shooting.columns.droplevel()
+
+    #rename columns to make data clearer
+    cols = shooting.columns.tolist()
+    cols[cols.index('SOG')] = 'SOG_For'
+    cols[cols.index('PIM')] = 'PIM_For'
+    cols[cols.index('PPG')] = 'PPG_For'
+    cols[cols.index('PPO')] = 'PPO_For'
+    cols[cols.index('SOG')] = 'SOG_Against'
+    cols[cols.index('PIM')] = 'PIM_Against'
+    cols[cols.index('PPG')] = 'PPG_Against'
+    cols[cols.index('PPO')] = 'PPO_Against'
+    shooting.columns = cols
+    shooting["Date"] = pd.to_datetime(shooting["Date"], errors="coerce")
+    return shooting
+
+def read_team_pages(schedule_html, gamelog_html=None):
+    '''
+    -----------------------------------------
+    Parses a team season's schedule and game log pages once each, taking the
+    tables and the navigation links from the same parse trees (read_html is
+    only used for tables without data-stat attributes)
+    Use: matches, shooting, schedule_links, gamelog_links = read_team_pages(schedule_html, gamelog_html)
+    -----------------------------------------
+    Parameters:
+        schedule_html - (string) team season schedule page
+        gamelog_html - (string) team season game log page, None to skip it
+    Returns:
+        matches - (dataframe) schedule table
+        shooting - (dataframe) game log table, None if no game log page
+        schedule_links - (dict) prev, schedule, gamelog links on the schedule page
+        gamelog_links - (dict) the same for the game log page
+    -----------------------------------------
+    '''
+    schedule_tree = parse_page(schedule_html)
+    try:
+        matches = schedule_table(schedule_tree)
+    except ValueError:
+        matches = legacy_schedule(schedule_html)
+
+    shooting = None
+    gamelog_links = {"prev": None, "schedule": None, "gamelog": None}
+    if gamelog_html is not None:
+        gamelog_tree = parse_page(gamelog_html)
+        try:
+            shooting = gamelog_table(gamelog_tree)
+        except ValueError:
+            shooting = legacy_gamelog(gamelog_html)
+        gamelog_links = page_links(gamelog_tree)
+    return matches, shooting, page_links(schedule_tree), gamelog_links
+
+def combine_team_season(matches, shooting, team_name, season):
+    '''
+    -----------------------------------------
+    Joins a team season's schedule with its game log stats
+    Use: team_data = combine_team_season(matches, shooting, team_name, season)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) schedule table
+        shooting - (dataframe) game log table, None to keep the schedule only
+        team_name - (string) team name
+        season - (string) season label, e.g. 2023-2024
+    Returns:
+        team_data - (dataframe) one row per game, None if the tables do not line up
+    -----------------------------------------
+    '''
+    if shooting is not None:
+        if 'OT' not in shooting.columns:
+            shooting['OT'] = None
+
+        #combine dataframes together
+        try:
+            matches = matches.merge(shooting[["Date", "SOG_For","SOG_Against","PIM_For","PIM_Against","OT","PPG_For","PPG_Against","PPO_For","PPO_Against"]], on = "Date")
+        except (ValueError, KeyError):
+            return None
+
+    #add season and team data
+    matches["Season"]= season
+    matches["Team"] = team_name
+    matches["Venue"] = matches["Venue"].replace('@', 'Away')
+    matches["Venue"] = matches["Venue"].fillna('Home')
+    return matches
+
+def parse_team_season(schedule_html, gamelog_html, team_name, season):
+    '''
+    -----------------------------------------
+    Parses one team's season from its schedule and game log pages
+    Use: team_data = parse_team_season(schedule_html, gamelog_html, team_name, season)
+    -----------------------------------------
+    Parameters:
+        schedule_html - (string) team season schedule page
+        gamelog_html - (string) team season game log page
+        team_name - (string) team name
+        season - (string) season label, e.g. 2023-2024
+    Returns:
+        team_data - (dataframe) one row per game, None if the pages do not line up
+    -----------------------------------------
+    '''
+    matches, shooting, _, _ = read_team_pages(schedule_html, gamelog_html)
+    return combine_team_season(matches, shooting, team_name, season)
+
+def team_past_stats(team_url, team_name, current_year, progress=print):
+    '''
+    -----------------------------------------
+    Get one team's past season stats, walking back season by season to FIRST_SEASON
+    Use: team_matches = team_past_stats(team_url, team_name, current_year)
+    -----------------------------------------
+    Parameters:
+        team_url - (string) team page url
+        team_name - (string) team name
+        current_year - (int) year the most recent completed season ends
+        progress - (function) called with a status message after each season is read
+    Returns:
+        team_matches - (list) dataframes, one per season
+    -----------------------------------------
+    '''
+    team_matches = []
+    links = page_links(parse_page(fetch(team_url)))
+    schedule_link = site_url(links["schedule"])
+    gamelog_link = site_url(links["gamelog"])
+
+    years = list(range(current_year,FIRST_SEASON-1,-1))
+    for year in years:
+        matches, shooting, schedule_links, gamelog_links = read_team_pages(fetch(schedule_link), fetch(gamelog_link))
+        team_data = combine_team_season(matches, shooting, team_name, f"{year-1}-{year}")
+        if team_data is None:
+            continue
+        team_matches.append(team_data)
+
+        progress(f"Successfully read {team_name} {year-1}-{year} stats")
+
+        #follow the previous season links found while parsing the pages
+        if schedule_links["prev"] is None or gamelog_links["prev"] is None:
+            break
+        schedule_link = site_url(schedule_links["prev"])
+        gamelog_link = site_url(gamelog_links["prev"])
+
+    return team_matches
+
+def past_stats(progress=print, current_year=None):
+    '''
+    -----------------------------------------
+    Get past season stats, from current season back to FIRST_SEASON
+    Use: df = past_stats()
+    -----------------------------------------
+    Parameters: 
+        progress - (function) called with a status message as pages are read
+        current_year - (int) year the most recent completed season ends, defaults to today's
+    Returns: 
+        df - (dataframe) has stats and information from past games
+    -----------------------------------------
+    '''
+    if current_year is None:
+        current_year = datetime.now().year
+        if (datetime.now().month < 4):
+            current_year -= 1
+    #get data from url with standings
+    standings_url = site_url(f"/leagues/NHL_{current_year}.html")
+    team_urls, team_names = team_links(standings_url)
+
+    #crawl teams in parallel, the shared fetcher keeps us under the request budget
+    results = get_fetcher().map(lambda team: team_past_stats(team[0], team[1], current_year, progress), zip(team_urls, team_names))
+    all_matches = [season for team_matches in results for season in team_matches]
 
     #get single dataframe
     match_df = pd.concat(all_matches)
@@ -141,119 +257,59 @@ def past_stats():
 
     return match_df
 
-def current_season():
+def team_current_stats(team_url, team_name, current_season, progress=print):
+    '''
+    -----------------------------------------
+    Get one team's current season game stats
+    Use: matches = team_current_stats(team_url, team_name, current_season)
+    -----------------------------------------
+    Parameters:
+        team_url - (string) team page url
+        team_name - (string) team name
+        current_season - (int) year the current season ends
+        progress - (function) called with a status message once the team is read
+    Returns:
+        matches - (dataframe) team's current season games, None if unreadable
+    -----------------------------------------
+    '''
+    links = page_links(parse_page(fetch(team_url, CURRENT_TTL)))
+    schedule_html = fetch(site_url(links["schedule"]), CURRENT_TTL)
+    gamelog_html = fetch(site_url(links["gamelog"]), CURRENT_TTL) if links["gamelog"] else None
+
+    matches, shooting, _, _ = read_team_pages(schedule_html, gamelog_html)
+    matches = combine_team_season(matches, shooting, team_name, f"{current_season-1}-{current_season}")
+    if matches is None:
+        return None
+
+    progress(f"Successfully read {team_name} {current_season-1}-{current_season} stats")
+
+    return matches
+
+def current_season(progress=print, season_year=None):
     '''
     -----------------------------------------
     Get current season (future) game stats
     Use: df = current_season
     -----------------------------------------
     Parameters: 
-        None
+        progress - (function) called with a status message as teams are read
+        season_year - (int) year the current season ends, defaults to today's
     Returns:
         df - (dataframe) has stats and information from current season games
     -----------------------------------------
     '''
-    current_season = datetime.now().year+1
-    if (datetime.now().month < 4):
-        current_season -= 1
+    current_season = season_year
+    if current_season is None:
+        current_season = datetime.now().year+1
+        if (datetime.now().month < 4):
+            current_season -= 1
     #get data from url with standings
-    standings_url = f"https://www.hockey-reference.com/leagues/NHL_{current_season}.html"
-    data = requests.get(standings_url)
-    time.sleep(2)
-
-    #get beginning table
-    soup = BeautifulSoup(data.text,features="lxml")
-    all_matches = []
-    team_urls = []
-    team_names = []
-    for x in range(0,2,1):
-        starting_table = soup.select('table', class_=['sortable','stats_table','now_sortable'])[x]
-            
-        #get team links and team name from table
-        links = starting_table.find_all('a')
-        for link in links:
-            href = link.get("href")
-            if href and '/teams/' in href:
-                full_url = f"https://www.hockey-reference.com{href}"
-                name = link.text.strip()  # Get visible text of link
-                team_urls.append(full_url)
-                team_names.append(name)
+    standings_url = site_url(f"/leagues/NHL_{current_season}.html")
+    team_urls, team_names = team_links(standings_url, CURRENT_TTL)
 
-    for x in range(0,len(team_urls),1): 
-        #get team url 
-        team_url = team_urls[x]
-        team_name = team_names[x]
-
-        data = requests.get(team_url)
-        time.sleep(2)
-
-        #get link from header
-        soup = BeautifulSoup(data.text,features="lxml")
-        bottom_nav = soup.select_one("#bottom_nav_container")
-        links = bottom_nav.find_all('a')
-        links = [l.get("href") for l in links]
-        schedule_link = [l for l in links if '_games' in l]
-        schedule_link = [f"https://www.hockey-reference.com{schedule_link[0]}"][0]
-
-        links = soup.find_all('a')
-        links = [l.get("href") for l in links]
-        links = [l for l in links if l and '_gamelog' in l]
-        gamelog_link = [f"https://www.hockey-reference.com{links[0]}"][0] 
-
-        data = requests.get(schedule_link)
-        time.sleep(2)
-        soup = BeautifulSoup(data.text,features="lxml")
-
-        #match dataframe
-        matches = pd.read_html(StringIO(data.text), match="Regular Season")[0]
-
-        #adjust cols
-        cols = matches.columns.tolist()
-        cols[cols.index("Unnamed: 7")] = 'Result'
-        cols[cols.index('Unnamed: 3')] = "Venue"
-        matches.columns = cols
-        matches = matches.drop(['Unnamed: 8','OL','Streak','Att.','LOG','Notes'], axis=1)
-
-        if (gamelog_link != None):
-            data = requests.get(gamelog_link)
-            time.sleep(2)
-
-            #shooting dataframe
-            shooting = pd.read_html(StringIO(data.text), match= "Regular Season")[0]
-            if isinstance(shooting.columns, pd.MultiIndex):
-                shooting.columns = shooting.columns.droplevel()
-
-            #rename columns to make data clearer
-            cols = shooting.columns.tolist()
-            cols[cols.index('SOG')] = 'SOG_For'
-            cols[cols.index('PIM')] = 'PIM_For'
-            cols[cols.index('PPG')] = 'PPG_For'
-            cols[cols.index('PPO')] = 'PPO_For'
-            cols[cols.index('SOG')] = 'SOG_Against'
-            cols[cols.index('PIM')] = 'PIM_Against'
-            cols[cols.index('PPG')] = 'PPG_Against'
-            cols[cols.index('PPO')] = 'PPO_Against'
-            shooting.columns = cols
-
-            if 'OT' not in shooting.columns:
-                shooting['OT'] = None
-
-            #combine dataframes together
-            try:
-                matches = matches.merge(shooting[["Date", "SOG_For","SOG_Against","PIM_For","PIM_Against","OT","PPG_For","PPG_Against","PPO_For","PPO_Against"]], on = "Date")
-            except ValueError:
-                continue
-
-        #add season and team data
-        matches["Season"]= f"{current_season-1}-{current_season}"
-        matches["Team"] = team_name
-        matches["Venue"] = matches["Venue"].replace('@', 'Away')
-        matches["Venue"] = matches["Venue"].fillna('Home')
-
-        print(f"Successfully read {team_name} {current_season-1}-{current_season} stats")
-
-        all_matches.append(matches)
-        time.sleep(2)
+    #crawl teams in parallel, the shared fetcher keeps us under the request budget
+    results = get_fetcher().map(lambda team: team_current_stats(team[0], team[1], current_season, progress), zip(team_urls, team_names))
+    all_matches = [matches for matches in results if matches is not None]
     
     match_df = pd.concat(all_matches)
     match_df.columns = [c.lower() for c in match_df.columns]
@@ -274,9 +330,9 @@ def get_start_date():
     current_season = datetime.now().year+1
     if (datetime.now().month < 4):
         current_season -= 1
-    standings_url = f"https://www.hockey-reference.com/leagues/NHL_{current_season}_games.html"
-    data = requests.get(standings_url)
-    soup = BeautifulSoup(data.text,features="lxml")
+    standings_url = site_url(f"/leagues/NHL_{current_season}_games.html")
+    data = fetch(standings_url, CURRENT_TTL)
+    soup = BeautifulSoup(data,features="lxml")
     starting_table = soup.select('table', class_=['sortable','stats_table','now_sortable'])[0]
 
     tbody = starting_table.find('tbody')
@@ -292,33 +348,211 @@ def get_start_date():
 
     return season_start_date
 
-def read_stats():
+def league_games(current_season):
     '''
     -----------------------------------------
-    Only reads necessary stats information, if past stats already in csv, only gets new game stats
-    Use: read_stats()
+    Gets the league wide schedule and scores for a season from one page
+    Use: games = league_games(current_season)
     -----------------------------------------
-    Parameters: 
+    Parameters:
+        current_season - (int) year the season ends
+    Returns:
+        games - (dataframe) one row per team per game: date, team, opponent, completed
+    -----------------------------------------
+    '''
+    data = fetch(site_url(f"/leagues/NHL_{current_season}_games.html"), CURRENT_TTL)
+    games = pd.read_html(StringIO(data), attrs={"id": "games"})[0]
+    games = games[games["Date"] != "Date"]
+    games["date"] = pd.to_datetime(games["Date"]).dt.normalize()
+    games["completed"] = pd.to_numeric(games["G"], errors="coerce").notna()
+
+    #one row from each team's point of view, matching matches.csv
+    home = games[["date", "Home", "Visitor", "completed"]].rename(columns={"Home": "team", "Visitor": "opponent"})
+    away = games[["date", "Visitor", "Home", "completed"]].rename(columns={"Visitor": "team", "Home": "opponent"})
+    return pd.concat([home, away], ignore_index=True)
+
+def teams_to_update(df, games, season):
+    '''
+    -----------------------------------------
+    Finds teams with games completed after their high-water mark (last stored
+    completed game) or whose remaining schedule no longer matches what is stored
+    Use: teams = teams_to_update(df, games, season)
+    -----------------------------------------
+    Parameters:
+        df - (dataframe) stored matches
+        games - (dataframe) league schedule from league_games
+        season - (string) current season label, e.g. 2025-2026
+    Returns:
+        teams - (set) current franchise names of teams that need their pages fetched
+    -----------------------------------------
+    '''
+    stored = df[df["season"] == season]
+    high_water = stored[stored["result"].notna()].groupby("team", observed=True)["date"].max()
+
+    #stored rows hold current franchise names, the site may still use an old one
+    games = games.assign(team=canonical_names(games["team"]), opponent=canonical_names(games["opponent"]))
+    completed = games[games["completed"]]
+    last_completed = completed["date"] > completed["team"].map(high_water).fillna(pd.Timestamp.min)
+    teams = set(completed.loc[last_completed, "team"])
+
+    #schedule changes: postponed, added or moved games
+    stored_keys = set(zip(stored["team"], stored["date"], stored["opponent"]))
+    league_keys = set(zip(games["team"], games["date"], games["opponent"]))
+    teams |= {key[0] for key in stored_keys ^ league_keys}
+    return teams
+
+def upsert_matches(df, updates, teams, season):
+    '''
+    -----------------------------------------
+    Upserts fetched rows newer than each team's high-water mark, keyed on
+    (team, date), dropping stored unplayed games that left the schedule
+    Use: df, changed = upsert_matches(df, updates, teams, season)
+    -----------------------------------------
+    Parameters:
+        df - (dataframe) stored matches
+        updates - (dataframe) freshly fetched current season rows for teams
+        teams - (set) teams that were fetched
+        season - (string) current season label
+    Returns:
+        df - (dataframe) updated matches
+        changed - (int) number of rows inserted or replaced
+    -----------------------------------------
+    '''
+    stored = df[df["season"] == season]
+    high_water = stored[stored["result"].notna()].groupby("team", observed=True)["date"].max()
+    updates = updates.assign(team=canonical_names(updates["team"]), opponent=canonical_names(updates["opponent"]))
+    updates = updates[updates["date"] > updates["team"].map(high_water).fillna(pd.Timestamp.min)]
+
+    #unplayed stored games for updated teams that are no longer on their schedule
+    update_keys = pd.MultiIndex.from_frame(updates[["team", "date"]])
+    df_keys = pd.MultiIndex.from_frame(df[["team", "date"]])
+    stale = (df["season"] == season) & df["team"].isin(teams) & df["result"].isna() & ~df_keys.isin(update_keys)
+    replaced = df_keys.isin(update_keys)
+
+    df = pd.concat([df[~(stale | replaced)], updates], ignore_index=True)
+    return df, len(updates)
+
+def incremental_update(df, progress=print):
+    '''
+    -----------------------------------------
+    Brings stored matches up to date by fetching only teams with newly completed
+    games or schedule changes, then upserting their new rows
+    Use: df = incremental_update(df)
+    -----------------------------------------
+    Parameters:
+        df - (dataframe) stored matches with parsed dates
+        progress - (function) called with status messages
+    Returns:
+        df - (dataframe) updated matches
+    -----------------------------------------
+    '''
+    current_season = datetime.now().year+1
+    if (datetime.now().month < 4):
+        current_season -= 1
+    season = f"{current_season-1}-{current_season}"
+
+    games = league_games(current_season)
+    teams = teams_to_update(df, games, season)
+    if not teams:
+        progress("Matches already up to date")
+        return df
+
+    team_urls, team_names = team_links(site_url(f"/leagues/NHL_{current_season}.html"), CURRENT_TTL)
+    to_fetch = [(url, name) for url, name, current in zip(team_urls, team_names, canonical_names(team_names)) if current in teams]
+    results = get_fetcher().map(lambda team: team_current_stats(team[0], team[1], current_season, progress), to_fetch)
+    results = [matches for matches in results if matches is not None]
+    if not results:
+        return df
+
+    updates = pd.concat(results, ignore_index=True)
+    updates.columns = [c.lower() for c in updates.columns]
+    updates["date"] = pd.to_datetime(updates["date"]).dt.normalize()
+
+    df, changed = upsert_matches(df, updates, teams, season)
+    progress(f"Updated {changed} rows for {len(to_fetch)} teams")
+    return df
+
+def check_games(df, progress=print):
+    '''
+    -----------------------------------------
+    Reports games whose home and away rows do not pair up, e.g. a team
+    missing from the scrape or a game listed twice, and team names the team
+    registry does not know (stored with team id -1 until they are added)
+    Use: check_games(df, progress)
+    -----------------------------------------
+    '''
+    unknown = unknown_teams(pd.concat([df["team"].astype(object), df["opponent"].astype(object)]))
+    if unknown:
+        progress(f"Teams missing from the team registry: {', '.join(unknown)}")
+    summary = report_summary(validate_games(df))
+    if summary:
+        progress(summary)
+
+def ingest(match_df, seasons=None, progress=print):
+    '''
+    -----------------------------------------
+    Writes the given seasons to the match store, checks their games and
+    brings their standings and team states up to date
+    Use: ingest(match_df, seasons, progress)
+    -----------------------------------------
+    Parameters:
+        match_df - (dataframe) match data
+        seasons - (list) season labels to write, None writes every season in match_df
+        progress - (function) called with status messages
+    Returns:
         None
+    -----------------------------------------
+    '''
+    with stage("ingest", rows=len(match_df)):
+        write_matches(match_df, seasons=seasons)
+        match_df = normalize_matches(match_df)
+        if seasons is not None:
+            match_df = match_df[match_df["season"].isin(seasons)]
+        check_games(match_df, progress)
+        update_standings(match_df, seasons)
+        update_team_states(match_df)
+
+def read_stats(full=False, progress=print):
+    '''
+    -----------------------------------------
+    Only reads necessary stats information, if past stats already in the match store, only gets new game stats
+    Use: read_stats(full)
+    -----------------------------------------
+    Parameters: 
+        full - (bool) re-scrape the whole current season instead of an incremental update
+        progress - (function) called with status messages, e.g. to stream them into the app
     Returns:
         None
     -----------------------------------------
     '''
-    #ensures it only reads past_stats if necessary (when the csv is empty of stats)
-    if os.path.exists('matches.csv') and os.path.getsize('matches.csv') > 0:
-        df = pd.read_csv('matches.csv')
-        season_start = get_start_date()
-            
-        df['date'] = pd.to_datetime(df['date'])
-        season_start = pd.to_datetime(season_start)
-            
-        past_df = df[df['date'] < season_start].copy()
+    season_year = datetime.now().year+1
+    if (datetime.now().month < 4):
+        season_year -= 1
+    season = f"{season_year-1}-{season_year}"
+
+    #ensures it only reads past_stats if necessary (when the store is empty of stats)
+    df = load_matches()
+    if not df.empty:
+        if not full:
+            with stage("scrape", mode="incremental"):
+                match_df = incremental_update(df, progress)
+            ingest(match_df, [season], progress)
+            write_prometheus()
+            progress("All matches read and input into the match store")
+            return
+
+        with stage("scrape", mode="full"):
+            season_start = get_start_date()
+            season_start = pd.to_datetime(season_start)
+
+            past_df = df[df['date'] < season_start]
+            current_df = current_season(progress)
     else:
-        past_df = past_stats()
-
-    current_df = current_season()
+        with stage("scrape", mode="history"):
+            past_df = past_stats(progress)
+            current_df = current_season(progress)
 
     match_df = pd.concat([past_df, current_df], ignore_index=True)
-    match_df["date"] = pd.to_datetime(match_df["date"]).dt.normalize()
-    match_df.to_csv("matches.csv", index=False)
-    print("All matches read and input into a csv file")
\ No newline at end of file
+    ingest(match_df, progress=progress)
+    write_prometheus()
+    progress("All matches read and input into the match store")
@@ -0,0 +1,167 @@
+import json
+import numpy as np
+import pandas as pd
+
+from match_predictor import load_match_history, build_features, make_model, ROLLING_COLS, PREDICTORS
+from incremental import update_model
+from team_state import load_team_states
+from teams import TEAM_NAMES, team_id
+from metrics import prometheus_text, stage
+from compiled import INFERENCE_BACKEND, CompiledModel, pick_winners
+
+class PredictionService:
+    '''
+    -----------------------------------------
+    Holds the trained model and per-team state in memory and scores batches
+    of (date, home_team, away_team) matchups
+    Use: service = PredictionService(); results = service.predict(games)
+    -----------------------------------------
+    '''
+    def __init__(self, today=None):
+        if today is None:
+            today = pd.Timestamp.today().normalize()
+        matches = load_match_history()
+        matchups = build_features(matches)
+
+        train = matchups[matchups["date"] < today]
+        #the pipeline's own update path, so the service serves the model run_predictions
+        #keeps and a stale model is advanced without dropping its incremental state
+        self.model = update_model("predict", make_model(), train[PREDICTORS], train["target"], train["date"])
+        self.booster = self.model.get_booster()
+        #numpy tree arrays scoring the same model, used with INFERENCE_BACKEND=compiled
+        self.compiled = CompiledModel.load("predict") if INFERENCE_BACKEND == "compiled" else None
+        self.state = load_team_states(ROLLING_COLS)
+
+        self.home_cols = [PREDICTORS.index(f"{c}_rolling_home") for c in ROLLING_COLS]
+        self.away_cols = [PREDICTORS.index(f"{c}_rolling_away") for c in ROLLING_COLS]
+
+    def features(self, games):
+        '''
+        -----------------------------------------
+        Builds the predictor matrix for a batch of matchups from the teams,
+        the game's weekday and each team's rolling state before the game
+        Use: x = service.features(games)
+        -----------------------------------------
+        Parameters:
+            games - (list) dicts with date, home_team, away_team, teams may be
+                    given by current name, abbreviation or former name
+        Returns:
+            x - (ndarray) games x predictors float32
+        -----------------------------------------
+        '''
+        given = [game["home_team"] for game in games] + [game["away_team"] for game in games]
+        ids = [team_id(team) for team in given]
+        names = [TEAM_NAMES.get(code) for code in ids]
+        unknown = sorted({str(team) for team, name in zip(given, names) if name not in self.state})
+        if unknown:
+            raise ValueError(f"Unknown teams: {', '.join(unknown)}")
+
+        x = np.zeros((len(games), len(PREDICTORS)), dtype=np.float32)
+        n = len(games)
+        x[:, PREDICTORS.index("venue_code")] = ids[:n]
+        x[:, PREDICTORS.index("opp_code")] = ids[n:]
+        dates = pd.to_datetime([game["date"] for game in games])
+        x[:, PREDICTORS.index("day_code")] = dates.dayofweek
+        #each team's state from the games it completed before the game's date
+        x[:, self.home_cols] = self.state.lookup(names[:n], dates)
+        x[:, self.away_cols] = self.state.lookup(names[n:], dates)
+        return x
+
+    def predict(self, games):
+        '''
+        -----------------------------------------
+        Scores a batch of matchups
+        Use: results = service.predict(games)
+        -----------------------------------------
+        Parameters:
+            games - (list) dicts with date, home_team, away_team
+        Returns:
+            results - (list) dicts with home/away win probabilities and predicted winner
+        -----------------------------------------
+        '''
+        if not games:
+            return []
+        with stage("serve", rows=len(games)):
+            x = self.features(games)
+            probs = self.compiled.predict_proba(x) if self.compiled is not None else self.booster.inplace_predict(x)
+        winners = pick_winners(probs, [game["home_team"] for game in games], [game["away_team"] for game in games])
+        return [
+            {
+                "date": game["date"],
+                "home_team": game["home_team"],
+                "away_team": game["away_team"],
+                "home_win_probability": float(prob),
+                "away_win_probability": float(1 - prob),
+                "predicted_winner": winner,
+            }
+            for game, prob, winner in zip(games, probs, winners)
+        ]
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+_service = None
+
+async def app(scope, receive, send):
+    '''
+    -----------------------------------------
+    ASGI app, run with: uvicorn service:app (from src)
+        GET  /health  -> {"status": "ok"}
+        GET  /teams   -> {"teams": [...]} names accepted by /predict
+        GET  /metrics -> prometheus text metrics
+        POST /predict {"games": [{"date", "home_team", "away_team"}, ...]}
+              -> {"predictions": [...]}
+    -----------------------------------------
+    '''
+    global _service
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                _service = PredictionService()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+    if _service is None:
+        _service = PredictionService()
+
+    if scope["path"] == "/health":
+        await send_json(send, 200, {"status": "ok"})
+    elif scope["path"] == "/metrics":
+        body = prometheus_text().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain; version=0.0.4"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+    elif scope["path"] == "/teams":
+        await send_json(send, 200, {"teams": sorted(_service.state.positions)})
+    elif scope["path"] == "/predict" and scope["method"] == "POST":
+        try:
+            games = json.loads(await read_body(receive))["games"]
+            predictions = _service.predict(games)
+        except (ValueError, KeyError, TypeError) as e:
+            await send_json(send, 400, {"error": str(e)})
+            return
+        await send_json(send, 200, {"predictions": predictions})
+    else:
+        await send_json(send, 404, {"error": "not found"})
@@ -0,0 +1,231 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from teams import team_division
+
+SIMULATIONS = 20000
+BATCH_SIZE = 2000
+#playoff format: top 3 of each division plus 2 wild cards per conference
+DIVISION_SPOTS = 3
+WILD_CARDS = 2
+
+#schedule shared with worker processes, set once per worker by init_worker
+_schedule = None
+
+def init_worker(schedule):
+    global _schedule
+    _schedule = schedule
+
+def current_points(matches, season):
+    '''
+    -----------------------------------------
+    Gets each team's record so far in a season, 2 points a win and 1 for an
+    overtime or shootout loss
+    Use: table = current_points(matches, season)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) match data with season, team, result, ot
+        season - (string) season label
+    Returns:
+        table - (dataframe) gp, wins, losses, ot_losses, points per team (teams
+                with no completed games have zeros)
+    -----------------------------------------
+    '''
+    rows = matches[matches["season"].astype(str) == season]
+    team = rows["team"].astype(str)
+    played = rows["result"].notna()
+    win = (rows["result"] == "W") & played
+    ot_loss = (rows["result"] == "L") & rows["ot"].isin(["OT", "SO"])
+    table = pd.DataFrame({
+        "gp": played.astype(int),
+        "wins": win.astype(int),
+        "losses": ((rows["result"] == "L") & ~ot_loss).astype(int),
+        "ot_losses": ot_loss.astype(int),
+    }).groupby(team.to_numpy()).sum()
+    table["points"] = 2 * table["wins"] + table["ot_losses"]
+    return table
+
+def overtime_rate(matches):
+    '''
+    -----------------------------------------
+    Share of completed games decided in overtime or a shootout
+    Use: rate = overtime_rate(matches)
+    -----------------------------------------
+    '''
+    played = matches[matches["result"].notna()]
+    if played.empty:
+        return 0.0
+    return float(played["ot"].isin(["OT", "SO"]).mean())
+
+def rank_within(score, groups):
+    '''
+    -----------------------------------------
+    Ranks teams within each group of every simulation, 0 is the highest score
+    Use: ranks = rank_within(score, groups)
+    -----------------------------------------
+    Parameters:
+        score - (ndarray) simulations x teams
+        groups - (ndarray) group code per team, -1 for teams in no group
+    Returns:
+        ranks - (ndarray) simulations x teams, -1 for teams in no group
+    -----------------------------------------
+    '''
+    ranks = np.full(score.shape, -1, dtype=np.int16)
+    for group in np.unique(groups[groups >= 0]):
+        cols = np.flatnonzero(groups == group)
+        order = np.argsort(-score[:, cols], axis=1)
+        block = np.empty(order.shape, dtype=np.int16)
+        np.put_along_axis(block, order, np.arange(len(cols), dtype=np.int16)[None, :], axis=1)
+        ranks[:, cols] = block
+    return ranks
+
+def simulate_batch(task):
+    '''
+    -----------------------------------------
+    Plays the rest of the season a batch of times at once: every game of every
+    simulation is drawn from the home win probability, losers of overtime
+    games get a point, then division ranks and playoff spots are set per
+    simulation (ties broken at random)
+    Use: counts = simulate_batch((simulations, seed))
+    -----------------------------------------
+    Parameters:
+        task - (tuple) number of simulations, seed sequence
+    Returns:
+        counts - (dict) points histogram, division rank counts and playoff
+                 counts per team, summed over the batch
+    -----------------------------------------
+    '''
+    simulations, seed = task
+    schedule = _schedule
+    rng = np.random.default_rng(seed)
+    games = len(schedule["probs"])
+    teams = len(schedule["points"])
+
+    home_win = rng.random((simulations, games), dtype=np.float32) < schedule["probs"]
+    overtime = (rng.random((simulations, games), dtype=np.float32) < schedule["ot_rate"]).astype(np.float32)
+    home_points = np.where(home_win, 2, overtime).astype(np.float32)
+    away_points = np.where(home_win, overtime, 2).astype(np.float32)
+    points = schedule["points"] + home_points @ schedule["home"] + away_points @ schedule["away"]
+
+    #less than a point of noise only breaks ties
+    score = points + rng.random((simulations, teams), dtype=np.float32) * 0.5
+    division_rank = rank_within(score, schedule["divisions"])
+    leaders = (division_rank >= 0) & (division_rank < DIVISION_SPOTS)
+    in_race = np.where(leaders | (schedule["conferences"] < 0), -np.inf, score)
+    wild_card = (rank_within(in_race, schedule["conferences"]) < WILD_CARDS) & ~leaders & (schedule["conferences"] >= 0)
+
+    team_index = np.broadcast_to(np.arange(teams), points.shape)
+    bins = schedule["max_points"] + 1
+    ranks = schedule["max_division"]
+    ranked = division_rank >= 0
+    return {
+        "points": np.bincount((team_index * bins + points.astype(np.int64)).ravel(), minlength=teams * bins).reshape(teams, bins),
+        "division_rank": np.bincount((team_index[ranked] * ranks + division_rank[ranked]), minlength=teams * ranks).reshape(teams, ranks),
+        "playoffs": (leaders | wild_card).sum(axis=0),
+    }
+
+def simulate_season(predictions, matches, season=None, simulations=SIMULATIONS, workers=None, seed=0, batch_size=BATCH_SIZE):
+    '''
+    -----------------------------------------
+    Monte Carlo projection of the final standings: simulates the remaining
+    schedule with the model's win probabilities, in batches spread over
+    worker processes, starting from the points teams already have
+    Use: projections = simulate_season(prob_pred_df, matches)
+    -----------------------------------------
+    Parameters:
+        predictions - (dataframe) upcoming games with season, home_team, away_team,
+                      home_win_probability (run_predictions output or predictions.csv)
+        matches - (dataframe) match data for the points so far and the overtime rate
+        season - (string) season label, defaults to the latest season in predictions
+        simulations - (int) number of simulated seasons
+        workers - (int) processes, defaults to the number of cores, 1 runs in process
+        seed - (int) random seed, the same seed and batch size give the same projections
+        batch_size - (int) simulations per batch
+    Returns:
+        projections - (dataframe) per team current and projected points (mean, 10th and
+                      90th percentile), division title and playoff odds, mean division rank
+    -----------------------------------------
+    '''
+    if season is None:
+        season = str(max(predictions["season"].astype(str)))
+    games = predictions[predictions["season"].astype(str) == season]
+    table = current_points(matches, season)
+
+    names = sorted(set(table.index) | set(games["home_team"].astype(str)) | set(games["away_team"].astype(str)))
+    table = table.reindex(names, fill_value=0)
+    positions = {team: i for i, team in enumerate(names)}
+    home = games["home_team"].astype(str).map(positions).to_numpy()
+    away = games["away_team"].astype(str).map(positions).to_numpy()
+
+    alignment = [team_division(team) for team in names]
+    conference_names = sorted({conference for conference, division in alignment if conference})
+    division_names = sorted({division for conference, division in alignment if division})
+    divisions = np.array([division_names.index(division) if division else -1 for conference, division in alignment])
+    conferences = np.array([conference_names.index(conference) if conference else -1 for conference, division in alignment])
+
+    #one hot team columns, a batch's points are two matrix products
+    one_hot = np.eye(len(names), dtype=np.float32)
+    remaining = np.bincount(home, minlength=len(names)) + np.bincount(away, minlength=len(names))
+    schedule = {
+        "probs": games["home_win_probability"].to_numpy(dtype=np.float32),
+        "home": one_hot[home],
+        "away": one_hot[away],
+        "points": table["points"].to_numpy(dtype=np.float32),
+        "ot_rate": np.float32(overtime_rate(matches)),
+        "divisions": divisions,
+        "conferences": conferences,
+        "max_points": int((table["points"].to_numpy() + 2 * remaining).max()) if names else 0,
+        "max_division": max(np.bincount(divisions[divisions >= 0]).max() if (divisions >= 0).any() else 1, 1),
+    }
+
+    sizes = [min(batch_size, simulations - start) for start in range(0, simulations, batch_size)]
+    tasks = list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+    if workers == 1 or len(tasks) == 1:
+        init_worker(schedule)
+        results = [simulate_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(tasks)), initializer=init_worker, initargs=(schedule,)) as pool:
+            results = list(pool.map(simulate_batch, tasks))
+
+    histogram = sum(result["points"] for result in results)
+    division_rank = sum(result["division_rank"] for result in results)
+    playoffs = sum(result["playoffs"] for result in results)
+
+    values = np.arange(histogram.shape[1])
+    cumulative = np.cumsum(histogram, axis=1)
+    ranked = division_rank.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_rank = (division_rank * np.arange(1, division_rank.shape[1] + 1)).sum(axis=1) / ranked
+    projections = pd.DataFrame({
+        "team": names,
+        "conference": [conference for conference, division in alignment],
+        "division": [division for conference, division in alignment],
+        "gp": table["gp"].to_numpy(),
+        "points": table["points"].to_numpy(),
+        "remaining": remaining,
+        "projected_points": (histogram * values).sum(axis=1) / simulations,
+        "points_p10": (cumulative < 0.1 * simulations).sum(axis=1),
+        "points_p90": (cumulative < 0.9 * simulations).sum(axis=1),
+        "mean_division_rank": np.where(ranked > 0, mean_rank, np.nan),
+        "division_title": division_rank[:, 0] / simulations,
+        "playoff_probability": playoffs / simulations,
+    })
+    return projections.sort_values(["conference", "division", "projected_points"], ascending=[True, True, False], ignore_index=True)
+
+if __name__ == "__main__":
+    from store import load_matches
+
+    parser = argparse.ArgumentParser(description="Project final standings and playoff odds from predictions.csv")
+    parser.add_argument("--simulations", type=int, default=SIMULATIONS, help="simulated seasons")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    predictions = pd.read_csv("predictions.csv")
+    projections = simulate_season(predictions, load_matches(columns=["season", "team", "result", "ot"]),
+                                  simulations=args.simulations, workers=args.workers, seed=args.seed)
+    print("----- Season Projections -----")
+    print(projections.to_string(index=False, float_format="%.3f"))
@@ -0,0 +1,195 @@
+import os
+import numpy as np
+import pandas as pd
+
+from store import STORE_DIR, load_matches, partition_path, store_exists
+
+STANDINGS_DIR = "standings"
+
+#match columns the standings are built from
+STANDINGS_INPUT = ["date", "season", "team", "team_id", "result", "gf", "ga", "sog_for", "pim_for"]
+
+#running totals per team, reset every season
+TOTAL_COLUMNS = ["gp", "wins", "losses", "goals_for", "goals_against", "shots", "pim"]
+
+def add_rates(table):
+    '''
+    -----------------------------------------
+    Adds the rate columns derived from the running totals
+    Use: table = add_rates(table)
+    -----------------------------------------
+    '''
+    gp = table["gp"].where(table["gp"] > 0)
+    table["win_rate"] = (table["wins"] / gp).fillna(0)
+    table["avg_shots"] = (table["shots"] / gp).fillna(0)
+    table["shooting_accuracy"] = (table["goals_for"] / table["shots"].where(table["shots"] > 0)).fillna(0)
+    table["avg_pim"] = (table["pim"] / gp).fillna(0)
+    return table
+
+def compute_standings(matches):
+    '''
+    -----------------------------------------
+    Builds the standings table: one row per team per completed game date
+    with the team's season to date totals and rates
+    Use: table = compute_standings(matches)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) match data with the STANDINGS_INPUT columns
+    Returns:
+        table - (dataframe) season, date, team, team_id, totals and rates
+    -----------------------------------------
+    '''
+    games = matches[matches["result"].notna()]
+    games = games.sort_values(["season", "team", "date"], kind="stable")
+    daily = pd.DataFrame({
+        "season": games["season"].astype(str).to_numpy(),
+        "date": games["date"].to_numpy(),
+        "team": games["team"].astype(str).to_numpy(),
+        "team_id": games["team_id"].to_numpy(),
+        "gp": np.ones(len(games), dtype=np.int64),
+        "wins": (games["result"] == "W").to_numpy().astype(np.int64),
+        "losses": (games["result"] == "L").to_numpy().astype(np.int64),
+        "goals_for": games["gf"].fillna(0).to_numpy(),
+        "goals_against": games["ga"].fillna(0).to_numpy(),
+        "shots": games["sog_for"].fillna(0).to_numpy(),
+        "pim": games["pim_for"].fillna(0).to_numpy(),
+    })
+    daily[TOTAL_COLUMNS] = daily.groupby(["season", "team"], sort=False)[TOTAL_COLUMNS].cumsum()
+    return add_rates(daily)
+
+def update_standings(matches, seasons=None, directory=STANDINGS_DIR):
+    '''
+    -----------------------------------------
+    Recomputes and writes the standings of the given seasons only, called as
+    games are ingested so history is never recomputed
+    Use: update_standings(matches, seasons)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) normalized match data covering the seasons
+        seasons - (list) season labels to write, None writes every season in matches
+        directory - (string) standings folder
+    Returns:
+        None
+    -----------------------------------------
+    '''
+    if seasons is None:
+        seasons = matches["season"].dropna().astype(str).unique()
+    for season in seasons:
+        table = compute_standings(matches[matches["season"].astype(str) == season])
+        path = partition_path(season, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        table.drop(columns="season").to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+def stale_seasons(directory=STANDINGS_DIR, store_directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Seasons whose stored games changed after their standings were written
+    Use: seasons = stale_seasons()
+    -----------------------------------------
+    '''
+    if not store_exists(store_directory):
+        return []
+    stale = []
+    for name in sorted(os.listdir(store_directory)):
+        if not name.startswith("season="):
+            continue
+        season = name.split("=", 1)[1]
+        standings_path = partition_path(season, directory)
+        if not os.path.exists(standings_path) or \
+                os.path.getmtime(standings_path) < os.path.getmtime(partition_path(season, store_directory)):
+            stale.append(season)
+    return stale
+
+def load_standings(seasons=None, directory=STANDINGS_DIR, store_directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Loads the standings table, first rebuilding any season missing or older
+    than its match store partition
+    Use: table = load_standings(seasons)
+    -----------------------------------------
+    Parameters:
+        seasons - (list) season labels to read, None reads all
+        directory - (string) standings folder
+        store_directory - (string) match store folder
+    Returns:
+        table - (dataframe) standings table
+    -----------------------------------------
+    '''
+    stale = stale_seasons(directory, store_directory)
+    if stale:
+        matches = load_matches(columns=STANDINGS_INPUT, seasons=stale, directory=store_directory)
+        update_standings(matches, stale, directory)
+    if not os.path.isdir(directory):
+        return add_rates(pd.DataFrame(columns=["season", "date", "team", "team_id"] + TOTAL_COLUMNS))
+
+    filters = [("season", "in", list(seasons))] if seasons is not None else None
+    table = pd.read_parquet(directory, filters=filters)
+    table["season"] = table["season"].astype(str)
+    return table
+
+def standings_as_of(table, date=None, season=None):
+    '''
+    -----------------------------------------
+    Standings on a date: each team's latest row on or before it, sorted by win rate
+    Use: standings = standings_as_of(table, date, season)
+    -----------------------------------------
+    Parameters:
+        table - (dataframe) standings table
+        date - (timestamp) standings date, None for the latest
+        season - (string) season label, None for the season of the date (or the latest season)
+    Returns:
+        standings - (dataframe) one row per team
+    -----------------------------------------
+    '''
+    if season is None:
+        seasons = table["season"] if date is None else table.loc[table["date"] <= pd.Timestamp(date), "season"]
+        if seasons.empty:
+            return table.iloc[0:0]
+        season = seasons.max()
+    rows = table[table["season"] == season]
+    if date is not None:
+        rows = rows[rows["date"] <= pd.Timestamp(date)]
+    latest = rows.sort_values("date", kind="stable").groupby("team", sort=False).tail(1)
+    return latest.sort_values(["win_rate", "wins"], ascending=False, ignore_index=True)
+
+def team_history(table, team, season=None):
+    '''
+    -----------------------------------------
+    One team's standings after each of its games
+    Use: history = team_history(table, team, season)
+    -----------------------------------------
+    '''
+    rows = table[table["team"] == team]
+    if season is not None:
+        rows = rows[rows["season"] == season]
+    return rows.sort_values("date", ignore_index=True)
+
+def team_stats(games):
+    '''
+    -----------------------------------------
+    Totals and rates per team over any set of games in one grouped aggregation
+    Use: stats = team_stats(games)
+    -----------------------------------------
+    Parameters:
+        games - (dataframe) match data, e.g. every past game
+    Returns:
+        stats - (dataframe) one row per team sorted by win rate
+    -----------------------------------------
+    '''
+    games = games[games["result"].notna()]
+    stats = games.assign(
+        wins=(games["result"] == "W").astype(int),
+        losses=(games["result"] == "L").astype(int),
+    ).groupby("team", observed=True).agg(
+        gp=("result", "size"),
+        wins=("wins", "sum"),
+        losses=("losses", "sum"),
+        goals_for=("gf", "sum"),
+        goals_against=("ga", "sum"),
+        shots=("sog_for", "sum"),
+        pim=("pim_for", "sum"),
+    )
+    stats = add_rates(stats.reset_index())
+    return stats.sort_values("win_rate", ascending=False, ignore_index=True)
@@ -0,0 +1,195 @@
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from games import game_ids
+from teams import canonical_names, team_ids
+
+STORE_DIR = "match_store"
+LEGACY_CSV = "matches.csv"
+
+TEAM_COLUMNS = ["team", "opponent"]
+CATEGORY_COLUMNS = ["venue", "result", "ot"]
+STRING_COLUMNS = ["time"]
+
+#every partition is written with the same compact schema (season is the partition key):
+#repeated strings as dictionaries (categories when loaded), stats as float32 since
+#upcoming games have no stats yet (NaN), games played and ids as int16
+MATCH_SCHEMA = pa.schema([
+    ("gp", pa.int16()),
+    ("date", pa.timestamp("us")),
+    ("time", pa.string()),
+    ("venue", pa.dictionary(pa.int8(), pa.string())),
+    ("opponent", pa.dictionary(pa.int16(), pa.string())),
+    ("gf", pa.float32()),
+    ("ga", pa.float32()),
+    ("result", pa.dictionary(pa.int8(), pa.string())),
+    ("w", pa.float32()),
+    ("l", pa.float32()),
+    ("sog_for", pa.float32()),
+    ("sog_against", pa.float32()),
+    ("pim_for", pa.float32()),
+    ("pim_against", pa.float32()),
+    ("ot", pa.dictionary(pa.int8(), pa.string())),
+    ("ppg_for", pa.float32()),
+    ("ppg_against", pa.float32()),
+    ("ppo_for", pa.float32()),
+    ("ppo_against", pa.float32()),
+    ("team", pa.dictionary(pa.int16(), pa.string())),
+    ("game_id", pa.string()),
+    ("team_id", pa.int16()),
+    ("opponent_id", pa.int16()),
+])
+
+def partition_path(season, directory=STORE_DIR):
+    return os.path.join(directory, f"season={season}", "part-0.parquet")
+
+def store_exists(directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Checks if the match store has any season partitions
+    Use: exists = store_exists()
+    -----------------------------------------
+    '''
+    return os.path.isdir(directory) and any(name.startswith("season=") for name in os.listdir(directory))
+
+def store_version(directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Gets a cheap version string for the store that changes whenever a
+    partition is rewritten, for invalidating caches built from it
+    Use: version = store_version()
+    -----------------------------------------
+    '''
+    if not store_exists(directory):
+        return ""
+    parts = []
+    for name in sorted(os.listdir(directory)):
+        path = partition_path(name.split("=", 1)[1], directory)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{name}:{stat.st_mtime_ns}:{stat.st_size}")
+    return "|".join(parts)
+
+def normalize_matches(df):
+    '''
+    -----------------------------------------
+    Gives match data the store's compact types: native dates, current
+    franchise names as categories with their fixed team registry ids, venue,
+    result and overtime as categories, float32 stats, and the game id shared
+    by each game's home and away rows
+    Use: df = normalize_matches(df)
+    -----------------------------------------
+    Parameters:
+        df - (dataframe) match data, e.g. freshly scraped or read from csv
+    Returns:
+        df - (dataframe) typed match data
+    -----------------------------------------
+    '''
+    df = df.reindex(columns=MATCH_SCHEMA.names + ["season"])
+    df["date"] = pd.to_datetime(df["date"]).dt.normalize()
+    for field in MATCH_SCHEMA:
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce")
+    for col in STRING_COLUMNS:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    for col in TEAM_COLUMNS:
+        df[col] = canonical_names(df[col]).astype("category")
+    for col in CATEGORY_COLUMNS:
+        df[col] = df[col].astype(object).where(df[col].notna(), None).astype("category")
+    df["team_id"] = team_ids(df["team"])
+    df["opponent_id"] = team_ids(df["opponent"])
+    df["game_id"] = game_ids(df)
+    return df
+
+def write_matches(df, seasons=None, directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Writes match data into one parquet partition per season, replacing those
+    partitions only (e.g. just the current season after an update)
+    Use: write_matches(df, seasons)
+    -----------------------------------------
+    Parameters:
+        df - (dataframe) match data with a season column
+        seasons - (list) season labels to write, None writes every season in df
+        directory - (string) store folder
+    Returns:
+        None
+    -----------------------------------------
+    '''
+    df = normalize_matches(df)
+    if seasons is None:
+        seasons = df["season"].dropna().unique()
+
+    for season in seasons:
+        season_df = df[df["season"] == season].drop(columns="season")
+        path = partition_path(season, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        #write then swap so readers never see a half written partition
+        tmp_path = f"{path}.tmp"
+        season_df.to_parquet(tmp_path, index=False, schema=MATCH_SCHEMA)
+        os.replace(tmp_path, path)
+
+def migrate_store(directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Rewrites partitions written with an older schema (e.g. before game ids
+    or with float64 stats) so every partition matches MATCH_SCHEMA
+    Use: migrated = migrate_store()
+    -----------------------------------------
+    Returns:
+        migrated - (list) seasons that were rewritten
+    -----------------------------------------
+    '''
+    migrated = []
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith("season="):
+            continue
+        season = name.split("=", 1)[1]
+        path = partition_path(season, directory)
+        if os.path.exists(path) and not pq.read_schema(path).remove_metadata().equals(MATCH_SCHEMA):
+            df = pd.read_parquet(path)
+            df["season"] = season
+            write_matches(df, [season], directory)
+            migrated.append(season)
+    return migrated
+
+def load_matches(columns=None, seasons=None, directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Loads match data from the store, importing the legacy csv on first use
+    Use: df = load_matches(columns, seasons)
+    -----------------------------------------
+    Parameters:
+        columns - (list) columns to read, None reads all
+        seasons - (list) season labels to read, None reads all
+        directory - (string) store folder
+    Returns:
+        df - (dataframe) match data with the compact store types and the season as a category
+    -----------------------------------------
+    '''
+    if not store_exists(directory):
+        if os.path.exists(LEGACY_CSV) and os.path.getsize(LEGACY_CSV) > 0:
+            write_matches(pd.read_csv(LEGACY_CSV), directory=directory)
+        else:
+            return pd.DataFrame(columns=columns)
+    migrate_store(directory)
+
+    filters = [("season", "in", list(seasons))] if seasons is not None else None
+    df = pd.read_parquet(directory, columns=columns, filters=filters)
+    if "season" in df.columns:
+        df["season"] = df["season"].astype(str).astype("category")
+    return df
+
+def clear_store(directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Removes every stored partition
+    Use: clear_store()
+    -----------------------------------------
+    '''
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
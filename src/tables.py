@@ -0,0 +1,160 @@
+import re
+import pandas as pd
+from lxml import html
+
+#schedule page columns by data-stat, named as the read_html path named them
+SCHEDULE_STATS = {
+    "games": "GP",
+    "date_game": "Date",
+    "time_game": "Time",
+    "game_location": "Venue",
+    "opp_name": "Opponent",
+    "goals": "GF",
+    "opp_goals": "GA",
+    "game_outcome": "Result",
+    "wins": "W",
+    "losses": "L",
+}
+SCHEDULE_REQUIRED = ["date_game", "game_location", "opp_name", "goals", "opp_goals", "game_outcome"]
+
+#game log page columns by data-stat
+GAMELOG_STATS = {
+    "date_game": "Date",
+    "shots": "SOG_For",
+    "opp_shots": "SOG_Against",
+    "pen_min": "PIM_For",
+    "opp_pen_min": "PIM_Against",
+    "overtimes": "OT",
+    "goals_pp": "PPG_For",
+    "opp_goals_pp": "PPG_Against",
+    "chances_pp": "PPO_For",
+    "opp_chances_pp": "PPO_Against",
+}
+GAMELOG_REQUIRED = ["date_game", "shots", "opp_shots", "pen_min", "opp_pen_min",
+                    "goals_pp", "opp_goals_pp", "chances_pp", "opp_chances_pp"]
+
+STRING_COLUMNS = ["Time", "Venue", "Opponent", "Result", "OT"]
+
+#regular season tables, found by id first and by caption if the id changes
+SCHEDULE_IDS = ["games"]
+GAMELOG_IDS = ["team_games", "tm_gamelog_rs"]
+
+def parse_page(text):
+    '''
+    -----------------------------------------
+    Parses a page once into an lxml tree
+    Use: tree = parse_page(text)
+    -----------------------------------------
+    '''
+    return html.fromstring(text)
+
+def find_table(tree, ids, caption="Regular Season"):
+    '''
+    -----------------------------------------
+    Finds a table by id, falling back to the first table whose caption
+    contains caption
+    Use: table = find_table(tree, ids)
+    -----------------------------------------
+    Returns:
+        table - (element) table element, None if not found
+    -----------------------------------------
+    '''
+    for table_id in ids:
+        tables = tree.xpath(f'//table[@id="{table_id}"]')
+        if tables:
+            return tables[0]
+    for table in tree.iter("table"):
+        found = table.find("caption")
+        if found is not None and caption in found.text_content():
+            return table
+    return None
+
+def extract_table(tree, ids, stats, required):
+    '''
+    -----------------------------------------
+    Pulls the columns in stats out of a table by their data-stat attributes,
+    one pass over the body rows, with typed columns
+    Use: df = extract_table(tree, ids, stats, required)
+    -----------------------------------------
+    Parameters:
+        tree - (element) parsed page
+        ids - (list) candidate table ids
+        stats - (dict) data-stat to column name
+        required - (list) data-stats the table must have
+    Returns:
+        df - (dataframe) one row per body row, dates as datetimes, numbers as floats
+    Raises:
+        ValueError - the table or a required data-stat is missing
+    -----------------------------------------
+    '''
+    table = find_table(tree, ids)
+    if table is None:
+        raise ValueError(f"No table with id {' or '.join(ids)}")
+    header = {cell.get("data-stat") for cell in table.xpath("./thead/tr/th")}
+    missing = [stat for stat in required if stat not in header]
+    if missing:
+        raise ValueError(f"Table {table.get('id')} is missing {', '.join(missing)}")
+
+    present = [stat for stat in stats if stat in header]
+    columns = {stat: [] for stat in present}
+    for row in table.xpath("./tbody/tr"):
+        if "thead" in (row.get("class") or ""):
+            continue
+        values = {cell.get("data-stat"): cell.text_content().strip() for cell in row}
+        if not values.get("date_game"):
+            continue
+        for stat in present:
+            columns[stat].append(values.get(stat, ""))
+
+    df = pd.DataFrame({stats[stat]: values for stat, values in columns.items()})
+    for col in df.columns:
+        if col == "Date":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif col in STRING_COLUMNS:
+            df[col] = df[col].where(df[col] != "", None)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+def page_links(tree):
+    '''
+    -----------------------------------------
+    Gets the previous season, schedule and game log links of a team page,
+    schedule page or game log page
+    Use: links = page_links(tree)
+    -----------------------------------------
+    Returns:
+        links - (dict) prev, schedule, gamelog hrefs (None when absent)
+    -----------------------------------------
+    '''
+    prev = tree.xpath('//a[contains(concat(" ", normalize-space(@class), " "), " button2 ") and '
+                      'contains(concat(" ", normalize-space(@class), " "), " prev ")]/@href')
+    links = {"prev": prev[0] if prev else None, "schedule": None, "gamelog": None}
+
+    #the team summary header and bottom nav link this team season's pages, search them first
+    hrefs = tree.xpath('//div[@data-template="Partials/Teams/Summary"]//a/@href') + \
+            tree.xpath('//*[@id="bottom_nav_container"]//a/@href') + tree.xpath('//a/@href')
+    for href in hrefs:
+        if links["schedule"] is None and re.search(r"/teams/.*_games\.html", href):
+            links["schedule"] = href
+        if links["gamelog"] is None and "_gamelog" in href:
+            links["gamelog"] = href
+    return links
+
+def schedule_table(tree):
+    '''
+    -----------------------------------------
+    Extracts the regular season schedule table from a parsed schedule page
+    Use: matches = schedule_table(tree)
+    -----------------------------------------
+    '''
+    return extract_table(tree, SCHEDULE_IDS, SCHEDULE_STATS, SCHEDULE_REQUIRED)
+
+def gamelog_table(tree):
+    '''
+    -----------------------------------------
+    Extracts the regular season game log table from a parsed game log page
+    Use: shooting = gamelog_table(tree)
+    -----------------------------------------
+    '''
+    return extract_table(tree, GAMELOG_IDS, GAMELOG_STATS, GAMELOG_REQUIRED)
@@ -0,0 +1,191 @@
+import os
+import numpy as np
+import pandas as pd
+
+from features import DEFAULT_WINDOW, ROLLING_COLS
+from store import STORE_DIR, load_matches, store_exists, partition_path
+
+#each team's rolling state after every completed game, kept current at ingest
+TEAM_STATE_FILE = "team_states.parquet"
+
+def state_names(cols):
+    return [f"{col}_state" for col in cols]
+
+def team_snapshots(matches, cols=ROLLING_COLS, window=DEFAULT_WINDOW):
+    '''
+    -----------------------------------------
+    Computes each team's rolling state after every completed game: the mean
+    of its last window completed games, that game included
+    Use: snapshots = team_snapshots(matches)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) match data with team, date and the stat columns
+        cols - (array) stats to average
+        window - (int) number of games averaged
+    Returns:
+        snapshots - (dataframe) team, date, the game's stats and {col}_state
+                    columns (NaN until the team has window games), sorted by team and date
+    -----------------------------------------
+    '''
+    cols = list(cols)
+    completed = matches.dropna(subset=cols)
+    snapshots = pd.DataFrame({
+        "team": completed["team"].astype(str).to_numpy(),
+        "date": completed["date"].to_numpy(),
+    })
+    for col in cols:
+        snapshots[col] = completed[col].to_numpy(dtype=np.float32)
+    snapshots = snapshots.sort_values(["team", "date"], kind="stable", ignore_index=True)
+
+    team = snapshots["team"].to_numpy()
+    first = np.r_[True, team[1:] != team[:-1]] if len(team) else np.zeros(0, dtype=bool)
+    starts = np.maximum.accumulate(np.where(first, np.arange(len(team)), 0)) if len(team) else np.zeros(0, dtype=int)
+
+    #window ends at and includes each row, clipped to the team's first row
+    sums = np.zeros((len(snapshots) + 1, len(cols)))
+    np.cumsum(snapshots[cols].to_numpy(dtype=float), axis=0, out=sums[1:])
+    end = np.arange(1, len(snapshots) + 1)
+    lo = np.maximum(end - window, starts)
+    means = (sums[end] - sums[lo]) / window
+    means[(end - lo) < window] = np.nan
+    for i, name in enumerate(state_names(cols)):
+        snapshots[name] = means[:, i].astype(np.float32)
+    return snapshots
+
+class TeamStateIndex:
+    '''
+    -----------------------------------------
+    In-memory index of every team's rolling state (mean of its last window
+    completed games) as of any date: a team x day table points at the
+    snapshot of the team's last game before that day, so features for any
+    matchup on any date are two array lookups
+    Use: index = TeamStateIndex(snapshots); states = index.lookup(teams, dates)
+    -----------------------------------------
+    '''
+    def __init__(self, snapshots, cols=ROLLING_COLS):
+        self.cols = list(cols)
+        snapshots = snapshots.sort_values(["team", "date"], kind="stable", ignore_index=True)
+        teams, codes = np.unique(snapshots["team"].to_numpy(dtype=str), return_inverse=True)
+        self.positions = {team: i for i, team in enumerate(teams)}
+
+        #unknown teams and days before a team's first game point at the last (NaN) row
+        states = snapshots[state_names(self.cols)].to_numpy(dtype=np.float32)
+        self.states = np.vstack([states, np.full((1, len(self.cols)), np.nan, dtype=np.float32)])
+        self.missing = len(states)
+
+        dates = snapshots["date"].to_numpy(dtype="datetime64[D]")
+        self.origin = dates.min() if len(dates) else np.datetime64(0, "D")
+        days = (dates - self.origin).astype(np.int64)
+        self.days = int(days.max()) + 1 if len(days) else 0
+
+        #pointer[t, d] is the last snapshot of team t dated before origin + d days
+        width = self.days + 1
+        keys = codes * width + days
+        queries = np.arange(len(teams) * width)
+        rows = np.searchsorted(keys, queries, side="left") - 1
+        valid = (rows >= 0) & (codes[np.maximum(rows, 0)] == queries // width) if len(keys) else np.zeros(len(queries), dtype=bool)
+        self.pointer = np.where(valid, rows, self.missing).reshape(len(teams), width).astype(np.int32)
+
+    @classmethod
+    def from_matches(cls, matches, cols=ROLLING_COLS, window=DEFAULT_WINDOW):
+        return cls(team_snapshots(matches, cols, window), cols)
+
+    def __contains__(self, team):
+        return team in self.positions
+
+    def lookup(self, teams, dates=None):
+        '''
+        -----------------------------------------
+        Gets the rolling stats of a batch of teams as of given dates, from the
+        games they completed before each date
+        Use: states = index.lookup(teams, dates)
+        -----------------------------------------
+        Parameters:
+            teams - (array) team names
+            dates - (array) dates, None gets each team's latest state
+        Returns:
+            states - (ndarray) teams x cols float32, NaN for unknown teams or
+                     teams without window games before the date
+        -----------------------------------------
+        '''
+        if len(teams) == 0 or not self.positions:
+            return np.full((len(teams), len(self.cols)), np.nan, dtype=np.float32)
+        positions = np.array([self.positions.get(str(team), -1) for team in teams])
+        if dates is None:
+            days = np.full(len(positions), self.days)
+        else:
+            offsets = np.asarray(dates, dtype="datetime64[D]") - self.origin
+            days = np.clip(offsets.astype(np.int64), 0, self.days)
+        rows = np.where(positions >= 0, self.pointer[np.maximum(positions, 0), days], self.missing)
+        return self.states[rows]
+
+def update_team_states(matches, cols=ROLLING_COLS, window=DEFAULT_WINDOW, path=TEAM_STATE_FILE, store_directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Brings the team state file up to date with ingested games: games after
+    each team's last snapshot are appended from the last window games on, and
+    anything else (older seasons, corrected games) rebuilds it from the store
+    Use: update_team_states(matches)
+    -----------------------------------------
+    Parameters:
+        matches - (dataframe) normalized match data that was just ingested
+        cols - (array) stats to average
+        window - (int) number of games averaged
+        path - (string) team state file
+        store_directory - (string) match store folder, read on a rebuild
+    Returns:
+        None
+    -----------------------------------------
+    '''
+    cols = list(cols)
+    games = matches.dropna(subset=cols)
+    games = pd.DataFrame({"team": games["team"].astype(str), "date": games["date"]}).join(games[cols])
+    table = pd.read_parquet(path) if os.path.exists(path) else None
+    appended = None
+    if table is not None and list(table.columns) == ["team", "date"] + cols + state_names(cols):
+        last = table.groupby("team")["date"].max()
+        after = (games["date"] > games["team"].map(last).fillna(pd.Timestamp.min)).to_numpy()
+
+        #games up to the last snapshots must already be in it with the same stats
+        known = table.set_index(["team", "date"])[cols]
+        old = games[~after].set_index(["team", "date"])
+        if old.index.isin(known.index).all() and \
+                np.allclose(known.loc[old.index].to_numpy(dtype=float), old.to_numpy(dtype=float)):
+            if after.sum() == 0:
+                return
+            tail = table.groupby("team").tail(window - 1)[["team", "date"] + cols]
+            recent = team_snapshots(pd.concat([tail, games[after]], ignore_index=True), cols, window)
+            added = recent["date"] > recent["team"].map(last).fillna(pd.Timestamp.min)
+            appended = pd.concat([table, recent[added]], ignore_index=True)
+
+    if appended is None:
+        appended = team_snapshots(load_matches(columns=["team", "date"] + cols, directory=store_directory), cols, window)
+    appended = appended.sort_values(["team", "date"], kind="stable", ignore_index=True)
+    tmp_path = f"{path}.tmp"
+    appended.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def load_team_states(cols=ROLLING_COLS, window=DEFAULT_WINDOW, path=TEAM_STATE_FILE, store_directory=STORE_DIR):
+    '''
+    -----------------------------------------
+    Loads the team state index, first rebuilding the state file if it is
+    missing or older than a match store partition
+    Use: index = load_team_states()
+    -----------------------------------------
+    '''
+    stale = not os.path.exists(path)
+    if not stale and store_exists(store_directory):
+        written = os.path.getmtime(path)
+        for name in os.listdir(store_directory):
+            partition = partition_path(name.split("=", 1)[1], store_directory) if name.startswith("season=") else None
+            if partition and os.path.exists(partition) and os.path.getmtime(partition) > written:
+                stale = True
+                break
+    if stale:
+        snapshots = team_snapshots(load_matches(columns=["team", "date"] + list(cols), directory=store_directory), cols, window)
+        tmp_path = f"{path}.tmp"
+        snapshots.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    else:
+        snapshots = pd.read_parquet(path)
+    return TeamStateIndex(snapshots, cols)
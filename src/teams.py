@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+#franchise id, current name, abbreviation, former names (renames and relocations)
+#ids are fixed, new franchises are appended and never renumbered so saved models keep reading them the same way
+FRANCHISES = [
+    (0, "Anaheim Ducks", "ANA", ["Mighty Ducks of Anaheim"]),
+    (1, "Arizona Coyotes", "ARI", ["Phoenix Coyotes"]),
+    (2, "Boston Bruins", "BOS", []),
+    (3, "Buffalo Sabres", "BUF", []),
+    (4, "Calgary Flames", "CGY", ["Atlanta Flames"]),
+    (5, "Carolina Hurricanes", "CAR", ["Hartford Whalers"]),
+    (6, "Chicago Blackhawks", "CHI", ["Chicago Black Hawks"]),
+    (7, "Colorado Avalanche", "COL", ["Quebec Nordiques"]),
+    (8, "Columbus Blue Jackets", "CBJ", []),
+    (9, "Dallas Stars", "DAL", ["Minnesota North Stars"]),
+    (10, "Detroit Red Wings", "DET", []),
+    (11, "Edmonton Oilers", "EDM", []),
+    (12, "Florida Panthers", "FLA", []),
+    (13, "Los Angeles Kings", "LAK", []),
+    (14, "Minnesota Wild", "MIN", []),
+    (15, "Montreal Canadiens", "MTL", ["Montréal Canadiens"]),
+    (16, "Nashville Predators", "NSH", []),
+    (17, "New Jersey Devils", "NJD", ["Colorado Rockies", "Kansas City Scouts"]),
+    (18, "New York Islanders", "NYI", []),
+    (19, "New York Rangers", "NYR", []),
+    (20, "Ottawa Senators", "OTT", []),
+    (21, "Philadelphia Flyers", "PHI", []),
+    (22, "Pittsburgh Penguins", "PIT", []),
+    (23, "San Jose Sharks", "SJS", []),
+    (24, "Seattle Kraken", "SEA", []),
+    (25, "St. Louis Blues", "STL", []),
+    (26, "Tampa Bay Lightning", "TBL", []),
+    (27, "Toronto Maple Leafs", "TOR", []),
+    (28, "Utah Mammoth", "UTA", ["Utah Hockey Club"]),
+    (29, "Vancouver Canucks", "VAN", []),
+    (30, "Vegas Golden Knights", "VEG", []),
+    (31, "Washington Capitals", "WSH", []),
+    (32, "Winnipeg Jets", "WPG", ["Atlanta Thrashers"]),
+]
+
+TEAM_NAMES = {franchise_id: name for franchise_id, name, abbreviation, former in FRANCHISES}
+
+#every accepted spelling (current name, abbreviation, former names) to the franchise id
+TEAM_IDS = {}
+for franchise_id, name, abbreviation, former in FRANCHISES:
+    for alias in [name, abbreviation] + former:
+        TEAM_IDS[alias] = franchise_id
+
+#current alignment, division to conference and member teams
+DIVISIONS = {
+    "Atlantic": ("Eastern", ["BOS", "BUF", "DET", "FLA", "MTL", "OTT", "TBL", "TOR"]),
+    "Metropolitan": ("Eastern", ["CAR", "CBJ", "NJD", "NYI", "NYR", "PHI", "PIT", "WSH"]),
+    "Central": ("Western", ["CHI", "COL", "DAL", "MIN", "NSH", "STL", "UTA", "WPG"]),
+    "Pacific": ("Western", ["ANA", "CGY", "EDM", "LAK", "SJS", "SEA", "VAN", "VEG"]),
+}
+
+#franchise id to (conference, division), inactive franchises have none
+TEAM_DIVISIONS = {}
+for division, (conference, abbreviations) in DIVISIONS.items():
+    for abbreviation in abbreviations:
+        TEAM_DIVISIONS[TEAM_IDS[abbreviation]] = (conference, division)
+
+def team_id(name):
+    '''
+    -----------------------------------------
+    Gets the fixed franchise id of a team name, abbreviation or former name
+    Use: code = team_id(name)
+    -----------------------------------------
+    Parameters:
+        name - (string) team name
+    Returns:
+        code - (int) franchise id, -1 if the name is not in the registry
+    -----------------------------------------
+    '''
+    return TEAM_IDS.get(str(name).strip(), -1)
+
+def team_ids(names):
+    '''
+    -----------------------------------------
+    Franchise ids for a column of team names, mapping each distinct name once
+    Use: codes = team_ids(df["team"])
+    -----------------------------------------
+    Parameters:
+        names - (series) team names
+    Returns:
+        codes - (ndarray) int16 franchise ids, -1 for names not in the registry
+    -----------------------------------------
+    '''
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+    lookup = np.array([team_id(name) for name in uniques] + [-1], dtype=np.int16)
+    return lookup[codes]
+
+def canonical_names(names):
+    '''
+    -----------------------------------------
+    Current franchise names for a column of team names, names not in the
+    registry are kept as they are
+    Use: df["team"] = canonical_names(df["team"])
+    -----------------------------------------
+    '''
+    names = pd.Series(names, dtype=object)
+    codes = team_ids(names)
+    current = pd.Series(codes, index=names.index).map(TEAM_NAMES)
+    return current.where(codes >= 0, names)
+
+def unknown_teams(names):
+    '''
+    -----------------------------------------
+    Team names missing from the registry, e.g. a new expansion team
+    Use: missing = unknown_teams(df["team"])
+    -----------------------------------------
+    '''
+    names = pd.Series(names, dtype=object).dropna().unique()
+    return sorted(name for name in names if team_id(name) < 0)
+
+def team_division(name):
+    '''
+    -----------------------------------------
+    Gets the conference and division a team plays in
+    Use: conference, division = team_division(name)
+    -----------------------------------------
+    Returns:
+        (conference, division) - (tuple) strings, (None, None) for teams not in the current alignment
+    -----------------------------------------
+    '''
+    return TEAM_DIVISIONS.get(team_id(name), (None, None))
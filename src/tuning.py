@@ -0,0 +1,202 @@
+import os
+import time
+import argparse
+import multiprocessing
+import numpy as np
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import log_loss
+
+from match_predictor import load_match_history, build_features, PREDICTORS
+from model_registry import save_tuned_config
+from backtest import completed_matchups
+
+#high confidence picks should be right at least this often on held-out games
+HIGH_CONF_PRECISION = 0.75
+
+#per worker state: DMatrix pairs built once and reused by every trial
+_splits = None
+_best = None
+_best_first = None
+_best_lock = None
+
+def init_worker(x, y, bounds, best, best_first, best_lock):
+    global _splits, _best, _best_first, _best_lock
+    _splits = [
+        (xgb.DMatrix(x[:train_end], label=y[:train_end]), xgb.DMatrix(x[train_end:valid_end], label=y[train_end:valid_end]))
+        for train_end, valid_end in bounds
+    ]
+    _best = best
+    _best_first = best_first
+    _best_lock = best_lock
+
+def time_splits(n, n_splits=3, valid_fraction=0.1):
+    '''
+    -----------------------------------------
+    Time ordered validation splits: each trains on every game before a block
+    and validates on the block, blocks being the last n_splits * valid_fraction of games
+    Use: bounds = time_splits(n)
+    -----------------------------------------
+    Returns:
+        bounds - (list) (train_end, valid_end) row positions
+    -----------------------------------------
+    '''
+    size = int(n * valid_fraction)
+    return [(n - (n_splits - i) * size, n - (n_splits - i - 1) * size) for i in range(n_splits)]
+
+def booster_params(params):
+    return dict(params, objective="binary:logistic", eval_metric="logloss", nthread=1)
+
+def sample_params(rng):
+    '''
+    -----------------------------------------
+    Draws one random point from the search space
+    Use: params = sample_params(rng)
+    -----------------------------------------
+    '''
+    return {
+        "learning_rate": float(10 ** rng.uniform(-2, -0.5)),
+        "max_depth": int(rng.integers(2, 9)),
+        "min_child_weight": float(10 ** rng.uniform(0, 1.3)),
+        "subsample": float(rng.uniform(0.6, 1.0)),
+        "colsample_bytree": float(rng.uniform(0.5, 1.0)),
+        "reg_lambda": float(10 ** rng.uniform(-1, 1)),
+    }
+
+def run_trial(trial):
+    '''
+    -----------------------------------------
+    Trains one parameter set on each time split with early stopping, giving
+    up after the first split if it is clearly worse than the best trial so
+    far did on that same split
+    Use: result = run_trial((trial_id, params, max_rounds, prune_margin))
+    -----------------------------------------
+    Returns:
+        result - (dict) trial id, params, mean validation log-loss, rounds,
+                 pruned flag and wall-clock seconds
+    -----------------------------------------
+    '''
+    trial_id, params, max_rounds, prune_margin = trial
+    start = time.perf_counter()
+
+    losses, rounds = [], []
+    for i, (train, valid) in enumerate(_splits):
+        booster = xgb.train(booster_params(params), train, num_boost_round=max_rounds, evals=[(valid, "valid")],
+                            early_stopping_rounds=20, verbose_eval=False)
+        prob = booster.predict(valid, iteration_range=(0, booster.best_iteration + 1))
+        losses.append(log_loss(valid.get_label(), prob, labels=[0, 1]))
+        rounds.append(booster.best_iteration + 1)
+
+        #prune: first split far behind the best finished trial's first split (split losses
+        #differ a lot, so comparing with its mean would favor trials with an easy first split)
+        if i == 0 and losses[0] > _best_first.value * (1 + prune_margin):
+            return {"trial": trial_id, "params": params, "loss": losses[0], "rounds": rounds[0],
+                    "pruned": True, "seconds": time.perf_counter() - start}
+
+    loss = float(np.mean(losses))
+    with _best_lock:
+        if loss < _best.value:
+            _best.value = loss
+            _best_first.value = losses[0]
+    return {"trial": trial_id, "params": params, "loss": loss, "rounds": int(np.mean(rounds)),
+            "pruned": False, "seconds": time.perf_counter() - start}
+
+def pick_thresholds(y, probs):
+    '''
+    -----------------------------------------
+    Picks the prediction threshold with the best accuracy and the lowest high
+    confidence threshold reaching HIGH_CONF_PRECISION, on held-out games that
+    early stopping did not see
+    Use: threshold, high_conf_threshold = pick_thresholds(y, probs)
+    -----------------------------------------
+    '''
+    candidates = np.round(np.arange(0.40, 0.91, 0.01), 2)
+    accuracy = [((probs > t) == y).mean() for t in candidates]
+    threshold = float(candidates[int(np.argmax(accuracy))])
+
+    high_conf_threshold = 0.9
+    for t in candidates[candidates >= 0.5]:
+        picked = probs > t
+        if picked.mean() >= 0.05 and y[picked].mean() >= HIGH_CONF_PRECISION:
+            high_conf_threshold = float(t)
+            break
+    return threshold, high_conf_threshold
+
+def tune(trials=40, workers=None, max_rounds=500, prune_margin=0.02, seed=0, holdout_fraction=0.1):
+    '''
+    -----------------------------------------
+    Random search over XGBoost hyperparameters with time ordered validation,
+    running trials in parallel and recording the best configuration; the
+    latest games are held out of the search and only used to pick the
+    thresholds for the winning parameters
+    Use: config, results = tune(trials, workers)
+    -----------------------------------------
+    Parameters:
+        trials - (int) parameter sets to try
+        workers - (int) processes, defaults to the number of cores
+        max_rounds - (int) boosting round limit, early stopping picks the actual count
+        prune_margin - (float) stop a trial after its first split if its loss is this much worse than the best
+        seed - (int) random seed for the search
+        holdout_fraction - (float) share of the latest games held out for the thresholds
+    Returns:
+        config - (dict) best params and thresholds, saved for run_predictions
+        results - (list) every trial result
+    -----------------------------------------
+    '''
+    games = completed_matchups(build_features(load_match_history()))
+    x = games[PREDICTORS].to_numpy(dtype=np.float32)
+    y = games["target"].to_numpy()
+    #the search and its early stopping only see games before the holdout block
+    holdout_start = len(games) - int(len(games) * holdout_fraction)
+    bounds = time_splits(holdout_start)
+
+    rng = np.random.default_rng(seed)
+    plan = [(i, sample_params(rng), max_rounds, prune_margin) for i in range(trials)]
+    #best finished loss and its first split loss are shared by all workers for pruning
+    manager = multiprocessing.Manager()
+    best = manager.Value("d", float("inf"))
+    best_first = manager.Value("d", float("inf"))
+    best_lock = manager.Lock()
+
+    start = time.perf_counter()
+    results = []
+    with manager, ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=init_worker, initargs=(x, y, bounds, best, best_first, best_lock)) as pool:
+        for result in pool.map(run_trial, plan):
+            status = "pruned" if result["pruned"] else f"{result['rounds']} rounds"
+            print(f"trial {result['trial']:>3}  loss {result['loss']:.4f}  {result['seconds']:6.2f}s  {status}")
+            results.append(result)
+    elapsed = time.perf_counter() - start
+
+    finished = [result for result in results if not result["pruned"]]
+    winner = min(finished, key=lambda result: result["loss"])
+
+    #refit the winner with its round count on everything before the holdout and score the holdout
+    booster = xgb.train(dict(booster_params(winner["params"]), nthread=os.cpu_count()), xgb.DMatrix(x[:holdout_start], label=y[:holdout_start]),
+                        num_boost_round=winner["rounds"])
+    y_holdout = y[holdout_start:]
+    holdout_probs = booster.predict(xgb.DMatrix(x[holdout_start:]))
+    threshold, high_conf_threshold = pick_thresholds(y_holdout, holdout_probs)
+    config = {
+        "params": dict(winner["params"], n_estimators=winner["rounds"]),
+        "threshold": threshold,
+        "high_conf_threshold": high_conf_threshold,
+        "validation_log_loss": winner["loss"],
+        "holdout_log_loss": float(log_loss(y_holdout, holdout_probs, labels=[0, 1])),
+    }
+    save_tuned_config(config)
+
+    trial_seconds = sum(result["seconds"] for result in results)
+    print(f"{trials} trials ({trials - len(finished)} pruned) in {elapsed:.1f}s wall, "
+          f"{trial_seconds:.1f}s of trial time, {trial_seconds / elapsed:.1f}x concurrency")
+    print(f"Best: loss {winner['loss']:.4f}, threshold {threshold}, high confidence {high_conf_threshold}")
+    print(config["params"])
+    return config, results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the prediction model's hyperparameters and thresholds")
+    parser.add_argument("--trials", type=int, default=40, help="parameter sets to try")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--holdout", type=float, default=0.1, help="share of the latest games held out to pick thresholds")
+    args = parser.parse_args()
+    tune(trials=args.trials, workers=args.workers, seed=args.seed, holdout_fraction=args.holdout)